@@ -28,10 +28,13 @@
 
 import time
 import sys
-import random
-import copy
+import argparse
 import os
+import math
+import collections
+import logging
 
+import cairo
 import gi
 gi.require_version('Gtk', '3.0')
 gi.require_version('Gdk', '3.0')
@@ -44,6 +47,16 @@ from gi.repository import Pango
 from gi.repository import PangoCairo
 
 from aplay import Aplay
+from soundbank import SoundBank, SoundBankError
+import engine
+import perfstats
+import replay
+import autoplay
+import versus
+import network
+import savegame
+import undo
+from scores import ScoreStore
 
 
 def color_parse(color):
@@ -54,25 +67,39 @@ def color_parse(color):
 
 class VanishingCursor:
 
-    def __init__(self, win, hide_time=3):
+    def __init__(self, win, hide_time=3, shown_cb=None):
         self.win = win
         self._blank_cursor = Gdk.Cursor.new(Gdk.CursorType.BLANK_CURSOR)
         self._old_cursor = self.win.get_window().get_cursor()
         self.hide_time = hide_time
+        self.hidden = False
+        # called when the cursor reappears, to arm a new hide deadline
+        self.shown_cb = shown_cb
         self.last_touched = time.time()
         self.win.connect("motion-notify-event", self.move_event)
         self.win.add_events(Gdk.EventMask.POINTER_MOTION_MASK)
 
     def move_event(self, win, event):
-        self._set_cursor(self._old_cursor)
         self.last_touched = time.time()
+        if self.hidden:
+            self.hidden = False
+            self._set_cursor(self._old_cursor)
+            if self.shown_cb is not None:
+                self.shown_cb()
         return True
 
     def time_event(self):
-        if time.time() - self.last_touched > self.hide_time:
+        if not self.hidden and \
+           time.time() - self.last_touched > self.hide_time:
+            self.hidden = True
             self._set_cursor(self._blank_cursor)
         return True
 
+    def deadline(self):
+        if self.hidden:
+            return None
+        return self.last_touched + self.hide_time
+
     def _set_cursor(self, cursor):
         self.win.get_window().set_cursor(cursor)
         Gdk.flush()
@@ -86,36 +113,6 @@ class BlockParty:
         '#101944', 'blue', 'green', 'cyan',
         'red', 'magenta', 'YellowGreen', 'white'
     ]]
-    figures = [
-        [[0, 0, 0, 0],
-         [0, 1, 1, 0],
-         [0, 1, 1, 0],
-         [0, 0, 0, 0]],
-        [[0, 0, 0, 0],
-         [0, 2, 2, 0],
-         [2, 2, 0, 0],
-         [0, 0, 0, 0]],
-        [[0, 0, 0, 0],
-         [3, 3, 0, 0],
-         [0, 3, 3, 0],
-         [0, 0, 0, 0]],
-        [[0, 0, 0, 0],
-         [4, 4, 4, 4],
-         [0, 0, 0, 0],
-         [0, 0, 0, 0]],
-        [[0, 0, 0, 0],
-         [0, 5, 5, 5],
-         [0, 5, 0, 0],
-         [0, 0, 0, 0]],
-        [[0, 0, 0, 0],
-         [6, 6, 6, 0],
-         [0, 6, 0, 0],
-         [0, 0, 0, 0]],
-        [[0, 0, 0, 0],
-         [0, 7, 0, 0],
-         [0, 7, 7, 7],
-         [0, 0, 0, 0]]]
-
     left_key = ['Left', 'KP_Left']
     right_key = ['Right', 'KP_Right']
     speed_key = ['Down', 'KP_Down']
@@ -123,17 +120,42 @@ class BlockParty:
     rotate_key = ['Up', 'KP_Up']
     exit_key = ['Escape']
     sound_toggle_key = ['s', 'S']
+    stats_toggle_key = ['p', 'P']
+    hint_key = ['h', 'H']
+    hint_color = color_parse('orange')
+    hint_width = 2
+
+    # sound priorities, game over sounds cut off anything else
+    sounds = {'heart.wav': 0, 'boom.au': 1,
+              'ouch.wav': 2, 'wah.au': 2, 'lost.wav': 2}
     enter_key = ['Return']
+    replay_key = ['r', 'R']
+    practice_key = ['t', 'T']
+    undo_key = ['z', 'Z']
+    redo_key = ['y', 'Y']
+    # number of players for a versus game
+    versus_keys = {'2': 2, '3': 3, '4': 4}
 
-    next_figure = None
-    level = 0
-    figure_score = 0
     scorex, scorey = 20, 100
-
-    IDLE, SELECT_LEVEL, PLAY, GAME_OVER = 0, 1, 2, 3
+    max_layouts = 32
+    # cleared rows alternate between white and empty
+    clear_colors = (7, 0)
+    clear_flash_time = 0.08
+    # seconds on the level screen before the computer plays a demo
+    demo_delay = 30
+    demo_level = 9
+    # longest a hint search may hold up the main loop at a time
+    hint_slice = 0.004
+    max_hints = 64
+    max_catchup_ticks = 5
+    # placements a practice game can take back
+    undo_depth = 50
+
+    IDLE, SELECT_LEVEL, PLAY, GAME_OVER, VERSUS, PAUSED = range(6)
 
     def __init__(self, toplevel_window, da, font_face='Sans', font_size=14,
-                 gcs=0, score_path=None):
+                 gcs=0, score_path=None, replay_path=None,
+                 stats_path=None):
 
         ghost_colors = []
         for clr in self.colors:
@@ -142,21 +164,23 @@ class BlockParty:
             ghost_colors.append(ghost_color)
 
         self.colors = self.colors + ghost_colors[1:]
+        self.rgba = [(c.red, c.green, c.blue, c.alpha) for c in self.colors]
 
-        self.glass = [[0] * self.bw for i in range(self.bh)]
+        self.engine = engine.Engine(self.bw, self.bh)
         self.window = toplevel_window
         self.da = da
         self.game_mode = self.IDLE
         self.sound = True
 
-        self.window_w = self.window.get_screen().get_width()
-        self.window_h = self.window.get_screen().get_height() - gcs
         self.window.set_title("Block Party")
         self.window.connect("destroy", lambda w: Gtk.main_quit())
-        da.set_size_request(self.window_w, self.window_h)
         da.connect("draw", self.draw_cb)
+        da.connect("size-allocate", self.size_allocate_cb)
+        da.connect("style-updated", self.static_changed_cb)
+        da.connect("notify::scale-factor", self.static_changed_cb)
         self.window.connect("key-press-event", self.keypress_cb)
         self.window.connect("key-release-event", self.keyrelease_cb)
+        self.window.connect("focus-out-event", self.focus_out_cb)
 
         self.color_back = color_parse("#343e76")
         self.color_glass = color_parse("#6e82e6")
@@ -164,274 +188,525 @@ class BlockParty:
         self.color_score = color_parse("white")
         self.color_ui_text = color_parse("#eeeeee")
 
-        self.bwpx = int(self.window_w / (self.bw + self.bw / 2 + 2))
-        self.bhpx = int(self.window_h / (self.bh + 2))
-        if self.bwpx < self.bhpx:
-            self.bhpx = self.bwpx
-        else:
-            self.bwpx = self.bhpx
-        self.xshift = int((self.window_w - (self.bw + 1) * self.bwpx) / 2)
-        self.yshift = int((self.window_h - (self.bh + 1) * self.bhpx) / 2)
-        self.xnext = self.window_w - self.xshift / \
-            2 - min(self.xshift / 2, 100)
-        self.ynext = self.window_h / 2 - min(self.window_h / 2, 200)
-
-        self.scorex = self.xshift / 2 - min(self.xshift / 2, 150)
-        self.scorey = self.window_h / 2 - min(self.window_h / 2, 100)
-
-        self.score_path = score_path
-
-        self.bonus = 0
+        self.scores = None
+        if score_path is not None:
+            self.scores = ScoreStore(score_path)
+        self.game_start = time.time()
+        self.replay_path = replay_path
+        self.recorder = None
+        self.player = None
+        self.autoplayer = None
+        self.demo_moves = []
+        self.history = None
+        self.versus = None
+        self.transport = None
+        # set once the activity is shared or joined, or there are peers
+        self.shared = False
+        self.network_id = None
+        self.show_hint = False
+        self.hint = None
+        self.hint_state = None
+        self.hint_search = None
+        self.hint_id = None
+        self.hints = collections.OrderedDict()
+        self.hint_player = None
+        if autoplay.AVAILABLE:
+            self.hint_player = autoplay.AutoPlayer(self.engine)
+        self.timer_id = None
+        self.vanishing_cursor = None
+        self.keys = engine.KeyRepeat()
+        self.input_id = None
+        self.view_boxes = None
+        self.clear_start = 0
+        self.clear_phase = 0
+        self.static_surface = None
+        self.layouts = collections.OrderedDict()
+        self.score_key = self.score_text = None
 
         self.font = Pango.FontDescription(font_face)
-        self.font.set_size(self.window_w * font_size * Pango.SCALE / 900)
-        self.audioplayer = Aplay()
-
+        self.font_size = font_size
+        # laid out for the screen until the widget gets its real size
+        self.window_w = self.window_h = None
+        screen = self.window.get_screen()
+        self.set_geometry(screen.get_width(), screen.get_height() - gcs)
+        try:
+            self.audioplayer = SoundBank(
+                [self.sound_path(name) for name in self.sounds])
+        except SoundBankError as e:
+            logging.warning('falling back to playbin: %s', e)
+            self.audioplayer = Aplay()
+
+        self.stats = perfstats.PerfStats()
+        if stats_path is None:
+            stats_path = os.environ.get('BLOCKPARTY_STATS')
+        self.stats_path = stats_path
+        self.show_stats = False
+        self.stats_due = 0
+        for name in ('tick', 'chk_glass'):
+            self.stats.wrap(self.engine, name, 'engine.' + name)
+        for name in ('timer_cb', 'update_picture', 'draw_static',
+                     'draw_score', 'draw_glass', 'draw_poster', 'draw_next',
+                     'hint_cb'):
+            self.stats.wrap(self, name)
+
+        # the engine reports its first figures as soon as it has a
+        # listener, which needs everything above
+        self.engine.listener = self.engine_cb
         self.init_game()
 
         def realize_cb(da):
-            self.vanishing_cursor = VanishingCursor(da, 5)
-            self.timer_id = GLib.timeout_add(20, self.timer_cb)
+            self.vanishing_cursor = VanishingCursor(da, 5, self.schedule)
+            self.schedule()
         self.da.connect("realize", realize_cb)
 
     def init_game(self):
-        self.clear_glass()
-        self.can_speed_up = True
-        self.linecount = 0
-        if self.score_path is not None:
-            self.hscore = self.read_highscore()
-        self.score = 0
-        self.new_figure()
-        self.set_level(5)
+        if self.scores is not None:
+            self.hscore = self.scores.highscore
+        self.engine.recorder = self.recorder = None
+        self.player = None
+        self.autoplayer = None
+        self.history = None
+        self.engine.reset()
+        self.keys.release_all()
+        self.next_tick = time.time() + self.engine.time_step
+        self.idle_since = time.time()
+        self.update_hint()
 
         self.queue_draw_complete()
         self.game_mode = self.SELECT_LEVEL
 
-    def set_time_step(self):
-        self.time_step = 0.1 + (9 - self.level) * 0.1
-
-    def draw_glass(self, cairo_ctx):
-        draw_glass = copy.deepcopy(self.glass)
-
-        ghost_figure = copy.deepcopy(self.figure)
-        ghost_py = self.generate_ghost_py(ghost_figure)
-
-        for i in range(4):
-            for j in range(4):
-                if self.py + i < self.bh and self.figure[i][j] != 0:
-                    draw_glass[self.py + i][self.px + j] = self.figure[i][j]
-                    draw_glass[ghost_py + i][self.px + j] = ghost_figure[i][j] + len(self.figures)
-
-        for i in range(self.bh):
-            for j in range(self.bw):
-                if self.view_glass is None or \
-                   draw_glass[i][j] != self.view_glass[i][j]:
-
-                    color = self.colors[draw_glass[i][j]]
-                    cairo_ctx.set_source_rgba(color.red,
-                                              color.green,
-                                              color.blue,
-                                              color.alpha)
-                    cairo_ctx.rectangle(
-                        self.xshift + j * self.bwpx,
-                        self.yshift + (self.bh - i - 1) * self.bhpx,
-                        self.bwpx - self.gridwidth, self.bhpx - self.gridwidth)
-
-                    cairo_ctx.fill()
+    def engine_cb(self, event, arg):
+        if event == engine.LOCK:
+            # only games that count for the high score raise it
+            if self.scores is not None and self.history is None and \
+               self.autoplayer is None and self.player is None:
+                if self.engine.score > self.hscore:
+                    self.hscore = self.engine.score
+            self.queue_draw_score()
+            self.make_sound('heart.wav')
+        elif event == engine.NEXT:
+            self.queue_draw_next()
+            if self.autoplayer is not None:
+                self.demo_moves = self.autoplayer.plan()
+        elif event == engine.GAME_OVER:
+            if self.autoplayer is not None:
+                self.init_game()
+                return
+            i = self.engine.rng.randint(0, 2)
+            if i == 0:
+                self.make_sound('ouch.wav')
+            if i == 1:
+                self.make_sound('wah.au')
+            if i == 2:
+                self.make_sound('lost.wav')
+            self.game_mode = self.GAME_OVER
+            self.queue_draw_complete()
+            if self.player is not None:
+                self.player = None
+                return
+            if self.history is not None:
+                return
+            if self.scores is not None:
+                self.scores.add(self.engine.score, self.engine.level,
+                                self.engine.linecount,
+                                time.time() - self.game_start)
+                GLib.idle_add(self.scores.save)
+            if self.recorder is not None and self.replay_path is not None:
+                GLib.idle_add(self.save_replay, self.recorder.encode())
+            self.engine.recorder = self.recorder = None
+        elif event == engine.CLEAR:
+            # the rows flash until the next tick removes them
+            GLib.timeout_add_seconds(1, self.reset_bonus_text)
+            self.make_sound('boom.au')
+            self.clear_start = time.time()
+            self.clear_phase = 0
+            self.queue_draw_glass(True)
 
-        self.view_glass = draw_glass
+    def draw_glass(self, cairo_ctx, clip):
+        eng = self.engine
+        batches = {}
+        cells = self.batch_cells(batches, eng, self.xshift, self.yshift,
+                                 self.bwpx, clip, self.clear_phase)
+        self.fill_cells(cairo_ctx, batches, self.bwpx)
+        self.stats.add('cells', cells)
+        if self.show_hint and self.hint is not None and \
+           self.game_mode == self.PLAY:
+            self.draw_hint(cairo_ctx)
+
+    def draw_hint(self, cairo_ctx):
+        # the hint is outlined rather than filled so that it is not taken
+        # for a second falling figure
+        shape, px, py = self.hint
+        cell = self.bwpx
+        inset = self.hint_width / 2
+        side = cell - self.gridwidth - self.hint_width
+        for i, j, color in shape.cells:
+            if py + i < self.bh:
+                cairo_ctx.rectangle(
+                    self.xshift + (px + j) * cell + inset,
+                    self.yshift + (self.bh - py - i - 1) * cell + inset,
+                    side, side)
+        color = self.hint_color
+        cairo_ctx.set_source_rgb(color.red, color.green, color.blue)
+        cairo_ctx.set_line_width(self.hint_width)
+        cairo_ctx.stroke()
+
+    def batch_cells(self, batches, eng, x0, y0, cell, clip, clear_phase,
+                    overlay=None, piece=True):
+        # adds the cells of the glass of eng with its top left corner at
+        # (x0, y0) that are inside the clip rectangle to batches, a
+        # color -> [(x, y), ...] dict, so each color is one fill however
+        # many glasses are drawn; returns the number of cells added
+        bw, bh = eng.bw, eng.bh
+        overlay = overlay or {}
+        if piece:
+            ghost_py = eng.ghost_py()
+            for i, j, color in eng.shape.cells:
+                if ghost_py + i < bh:
+                    overlay[ghost_py + i, eng.px + j] = \
+                        color + len(eng.figures)
+            for i, j, color in eng.shape.cells:
+                if eng.py + i < bh:
+                    overlay[eng.py + i, eng.px + j] = color
+
+        j0 = max(0, (clip.x - x0) // cell)
+        j1 = min(bw - 1, (clip.x + clip.width - 1 - x0) // cell)
+        i0 = max(0, bh - 1 - (clip.y + clip.height - 1 - y0) // cell)
+        i1 = min(bh - 1, bh - 1 - (clip.y - y0) // cell)
+        if i0 > i1 or j0 > j1:
+            return 0
+        for i in range(i0, i1 + 1):
+            row = eng.glass[i]
+            if i in eng.clearing:
+                row = [self.clear_colors[clear_phase % 2]] * bw
+            y = y0 + (bh - i - 1) * cell
+            for j in range(j0, j1 + 1):
+                batches.setdefault(overlay.get((i, j), row[j]), []).append(
+                    (x0 + j * cell, y))
+        return (i1 - i0 + 1) * (j1 - j0 + 1)
+
+    def fill_cells(self, cairo_ctx, batches, cell):
+        w = h = cell - self.gridwidth
+        for color, cells in batches.items():
+            cairo_ctx.set_source_rgba(*self.rgba[color])
+            for x, y in cells:
+                cairo_ctx.rectangle(x, y, w, h)
+            cairo_ctx.fill()
 
     def quit_game(self):
+        self.dump_stats()
         self.audioplayer.close()
         sys.exit()
 
+    def dump_stats(self):
+        if self.stats_path is None:
+            return
+        try:
+            self.stats.dump(self.stats_path)
+        except OSError as e:
+            logging.error('cannot write stats: %s', e)
+
     def key_action(self, key):
         if key in self.exit_key:
             self.quit_game()
+        if self.versus is not None:
+            # the players' keys take over the toggles
+            if self.versus.finished and key in self.enter_key:
+                self.versus.close()
+                self.versus = None
+                self.init_game()
+            elif self.versus.key_press(key):
+                self.queue_input()
+            return
         if key in self.sound_toggle_key:
             self.sound = not self.sound
             return
+        if key in self.stats_toggle_key:
+            self.show_stats = not self.show_stats
+            self.stats_due = 0
+            self.queue_draw_score()
+            return
+        if key in self.hint_key and self.hint_player is not None:
+            self.show_hint = not self.show_hint
+            self.update_hint()
+            self.queue_draw_glass(True)
+            return
+        self.idle_since = time.time()
+        if self.autoplayer is not None:
+            # any key ends the demo
+            self.init_game()
+            return
+        if self.game_mode == self.PAUSED:
+            self.game_mode = self.PLAY
+            self.next_tick = time.time() + self.engine.time_step
+            self.queue_draw_complete()
+            return
+        if self.game_mode in (self.SELECT_LEVEL, self.GAME_OVER) and \
+           key in self.replay_key:
+            self.start_replay()
+            return
+        if self.history is not None and \
+           (key in self.undo_key or key in self.redo_key):
+            self.step_history(key in self.undo_key)
+            return
+        if self.game_mode == self.SELECT_LEVEL and key in self.versus_keys:
+            self.start_versus(self.versus_keys[key])
+            return
         if self.game_mode == self.SELECT_LEVEL:
             if key in self.left_key:
-                self.set_level(self.level - 1)
+                self.set_level(self.engine.level - 1)
                 self.queue_draw_glass(True)
             else:
                 if key in self.right_key:
-                    self.set_level(self.level + 1)
+                    self.set_level(self.engine.level + 1)
                     self.queue_draw_glass(True)
+                elif self.shared and key not in self.practice_key:
+                    # play against the others sharing the activity
+                    self.start_versus(1, self.transport)
                 else:  # if key in enter_key:
                     self.queue_draw_complete()
-                    self.next_tick = time.time() + self.time_step
+                    self.next_tick = time.time() + self.engine.time_step
                     self.game_mode = self.PLAY
+                    self.game_start = time.time()
+                    if key in self.practice_key:
+                        # neither recorded nor scored
+                        self.history = undo.History(self.engine,
+                                                    self.undo_depth)
+                        self.history.capture()
+                    else:
+                        self.recorder = replay.Recorder(self.engine)
             return
         if self.game_mode == self.IDLE:
             return
         if self.game_mode == self.GAME_OVER:
             if key in self.enter_key:
                 self.init_game()
-                return
+            return
+        if self.player is not None:
+            return
 
-        changed = False
-        if key in self.left_key:
-            self.px -= 1
-            if not self.figure_fits():
-                self.px += 1
-            else:
-                changed = True
-        if key in self.right_key:
-            self.px += 1
-            if not self.figure_fits():
-                self.px -= 1
-            else:
-                changed = True
-        if key in self.speed_key and self.can_speed_up:
-            self.time_step = (9 - self.level) * 0.005
-        if key in self.drop_key:
-            changed = self.drop_figure()
-        if key in self.rotate_key:
-            changed = self.rotate_figure_ccw(True)
-        if changed:
-            self.queue_draw_glass(False)
+        if key in self.speed_key:
+            self.engine.speed_up()
+            return
+        action = self.key_to_action(key)
+        if action is not None and self.keys.press(action, time.time()):
+            self.queue_input()
+
+    def key_to_action(self, key):
+        for keys, action in ((self.left_key, engine.LEFT),
+                             (self.right_key, engine.RIGHT),
+                             (self.rotate_key, engine.ROTATE),
+                             (self.drop_key, engine.DROP)):
+            if key in keys:
+                return action
+        return None
+
+    def queue_input(self):
+        # apply a burst of key events together, before the next redraw
+        if self.input_id is None:
+            self.input_id = GLib.idle_add(self.process_input,
+                                          priority=GLib.PRIORITY_HIGH_IDLE)
+
+    def process_input(self):
+        self.input_id = None
+        if self.versus is not None:
+            self.versus.process_input(time.time())
+            return False
+        actions = self.keys.poll(time.time(), bool(self.engine.clearing))
+        if self.game_mode == self.PLAY:
+            changed = False
+            for action in actions:
+                changed = self.engine.step(action) or changed
+            if changed:
+                self.queue_draw_glass(False)
+        return False
 
     def tick(self):
-        self.py -= 1
-        self.queue_draw_glass(False)
-        if self.figure_score > 0:
-            self.figure_score -= 1
-        if not self.figure_fits():
-            self.py += 1
-            self.can_speed_up = False
-            self.set_time_step()
-            self.put_figure()
-            self.make_sound('heart.wav')
-            self.new_figure()
-            if not self.figure_fits():
-                i = random.randint(0, 2)
-                if i == 0:
-                    self.make_sound('ouch.wav')
-                if i == 1:
-                    self.make_sound('wah.au')
-                if i == 2:
-                    self.make_sound('lost.wav')
-                self.game_mode = self.GAME_OVER
-
-                self.queue_draw_complete()
-                return
-        self.chk_glass()
-        new_level = int(self.linecount / 5)
-        if new_level > self.level:
-            self.set_level(new_level)
-
-    def new_figure(self):
-        self.figure_score = self.bh + self.level
-        self.figure = copy.deepcopy(
-            self.figures[random.randint(0, len(self.figures) - 1)])
-        for i in range(random.randint(0, 3)):
-            self.rotate_figure_ccw(False)
-        self.figure, self.next_figure = self.next_figure, self.figure
-        self.px = self.bw // 2 - 2
-        self.py = self.bh - 3
-        if self.figure is None:
-            self.new_figure()
-        else:
-            self.queue_draw_next()
+        clearing = self.engine.clearing
+        self.engine.tick()
+        if self.player is not None:
+            self.player.tick()
+            self.apply_replay()
+        if self.autoplayer is not None and self.demo_moves and \
+           not self.engine.clearing:
+            self.engine.step(self.demo_moves.pop(0))
+        if self.history is not None and not self.engine.game_over and \
+           not self.engine.clearing and \
+           self.engine.dealt != self.history.dealt:
+            # a new figure, once any full rows are gone
+            self.history.capture()
+        if clearing and not self.engine.clearing and self.keys.pending:
+            # keys pressed during the flash move the new figure
+            self.queue_input()
+        self.queue_draw_glass(bool(clearing))
+        self.update_hint()
+
+    def step_history(self, back):
+        changed = self.history.undo() if back else self.history.redo()
+        if not changed:
+            return
+        self.keys.release_all()
+        self.game_mode = self.PLAY
+        self.next_tick = time.time() + self.engine.time_step
+        # the ghost is cached by glass version, the hint and score text
+        # by their contents; the glass is redrawn whole
+        self.view_boxes = None
+        self.update_hint()
+        self.queue_draw_complete()
 
-    def rotate_figure_cw(self, check_fit):
-        oldfigure = copy.deepcopy(self.figure)
-        for i in range(4):
-            for j in range(4):
-                self.figure[i][j] = oldfigure[j][3 - i]
-        if not check_fit or self.figure_fits():
-            return True
-        else:
-            self.figure = oldfigure
-            return False
+    def update_hint(self):
+        # the best place for the current figure, looked up or searched
+        # for in idle time a slice at a time
+        eng = self.engine
+        if not self.show_hint or eng.clearing:
+            return
+        state = self.get_hint_state()
+        if state == self.hint_state:
+            return
+        self.hint_state = state
+        self.hint = None
+        if self.hint_id is not None:
+            GLib.source_remove(self.hint_id)
+            self.hint_id = None
+        if state in self.hints:
+            self.hints.move_to_end(state)
+            self.set_hint(self.hints[state])
+            return
+        self.hint_search = self.hint_player.search(
+            eng.rows, eng.figure, next_figure=eng.next_figure)
+        self.hint_id = GLib.idle_add(self.hint_cb)
 
-    def rotate_figure_ccw(self, check_fit):
-        oldfigure = copy.deepcopy(self.figure)
-        for i in range(4):
-            for j in range(4):
-                self.figure[i][j] = oldfigure[3 - j][i]
-        if not check_fit or self.figure_fits():
-            return True
-        else:
-            self.figure = oldfigure
-            return False
+    def get_hint_state(self):
+        eng = self.engine
+        return (tuple(eng.rows), eng.figure, eng.next_figure)
 
-    def drop_figure(self):
-        oldy = self.py
-        self.py -= 1
-        while self.figure_fits():
-            self.py -= 1
-        self.py += 1
-        return oldy != self.py
-
-    # Takes Argument py to calculate for ghost_peice
-    def figure_fits(self, py=None, figure=None):
-        if not py and not figure:
-            py = self.py
-            figure = self.figure
-        for i in range(4):
-            for j in range(4):
-                if self.figure[i][j] != 0:
-                    if i + py < 0 or \
-                       j + self.px < 0 or j + self.px >= self.bw:
-                        return False
-                    if i + py < self.bh:
-                        if self.glass[i + py][j + self.px] != 0:
-                            return False
+    def hint_cb(self):
+        deadline = time.perf_counter() + self.hint_slice
+        try:
+            while time.perf_counter() < deadline:
+                next(self.hint_search)
+        except StopIteration as stop:
+            self.hint_id = self.hint_search = None
+            self.hints[self.hint_state] = stop.value
+            if len(self.hints) > self.max_hints:
+                self.hints.popitem(last=False)
+            if self.hint_state == self.get_hint_state():
+                self.set_hint(stop.value)
+            return False
         return True
 
-    def put_figure(self):
-        self.score += self.figure_score
-        if self.score_path is not None:
-            if self.score > self.hscore:
-                self.hscore = self.score
-        self.queue_draw_score()
-        for i in range(4):
-            for j in range(4):
-                if i + self.py < self.bh and self.figure[i][j] != 0:
-                    self.glass[i + self.py][j + self.px] = self.figure[i][j]
-
-    def generate_ghost_py(self, figure):
-        ghost_py = self.py - 1
-        while self.figure_fits(ghost_py, figure):
-            ghost_py -= 1
-        return ghost_py + 1
-        
-    def bonus_line_Score(self, line):
-        self.bonus = 50 - (line * 2)
-        self.score += self.bonus
-        GLib.timeout_add_seconds(1, self.reset_bonus_text)
+    def set_hint(self, move):
+        # the hint is drawn as the figure resting at (rotation, px)
+        eng = self.engine
+        if move is not None:
+            rotation, px = move
+            shape = engine.ORIENTATIONS[eng.figure][rotation]
+            self.hint = (shape, px, eng.landing_py(shape, px, self.bh))
+        self.queue_draw_glass(True)
+
+    def start_versus(self, players, transport=None):
+        self.versus = versus.Versus(self, players, self.engine.level,
+                                    transport)
+        self.game_mode = self.VERSUS
+        self.da.queue_draw()
+        self.schedule()
+
+    def set_transport(self, transport):
+        # play shared games through transport, see network.py
+        self.transport = transport
+        if isinstance(transport, network.SocketTransport):
+            self.network_id = GLib.io_add_watch(
+                transport.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN,
+                self.network_cb)
+
+    def network_cb(self, fd, condition):
+        return self.transport.read()
+
+    def start_demo(self):
+        self.init_game()
+        self.engine.set_level(self.demo_level)
+        self.autoplayer = autoplay.AutoPlayer(self.engine)
+        self.demo_moves = self.autoplayer.plan()
+        self.next_tick = time.time() + self.engine.time_step
+        self.game_mode = self.PLAY
+        self.queue_draw_complete()
+
+    def start_replay(self):
+        # play the last recorded game back in real time
+        if self.replay_path is None:
+            return
+        try:
+            with open(self.replay_path, 'rb') as fp:
+                recording = replay.Recording.decode(fp.read())
+        except (OSError, ValueError) as e:
+            logging.error('cannot replay: %s', e)
+            return
+        if (recording.bw, recording.bh) != (self.bw, self.bh):
+            return
+        self.init_game()
+        self.engine.reset(seed=recording.seed)
+        self.engine.set_level(recording.level)
+        self.player = replay.Player(recording)
+        self.apply_replay()
+        self.next_tick = time.time() + self.engine.time_step
+        self.game_mode = self.PLAY
+        self.queue_draw_complete()
+
+    def save_game(self):
+        # the game in progress, or None if there is none worth resuming;
+        # practice games would come back scored, so they are not kept
+        if self.game_mode not in (self.PLAY, self.PAUSED) or \
+           self.player is not None or self.autoplayer is not None or \
+           self.history is not None:
+            return None
+        start = time.perf_counter()
+        data = savegame.encode(self.engine)
+        self.stats.add('save.encode', time.perf_counter() - start)
+        return data
+
+    def resume_game(self, data):
+        # continue a game saved by save_game(), paused until a key is
+        # pressed; resumed games are not recorded
+        self.init_game()
+        start = time.perf_counter()
+        try:
+            savegame.decode(self.engine, data)
+        except ValueError as e:
+            logging.error('cannot resume game: %s', e)
+            self.init_game()
+            return
+        self.stats.add('save.decode', time.perf_counter() - start)
+        if self.scores is not None:
+            self.hscore = max(self.hscore, self.engine.score)
+        self.game_mode = self.PAUSED
+        self.game_start = time.time()
+        self.update_hint()
+        self.queue_draw_complete()
+        self.schedule()
+
+    def apply_replay(self):
+        for code in self.player.actions():
+            replay.apply(self.engine, code)
+
+    def save_replay(self, data):
+        tmp = self.replay_path + '.tmp'
+        try:
+            with open(tmp, 'wb') as fp:
+                fp.write(data)
+            os.replace(tmp, self.replay_path)
+        except OSError as e:
+            logging.error('cannot save replay: %s', e)
+        return False
+
+    def animate_clear(self):
+        phase = int((time.time() - self.clear_start) / self.clear_flash_time)
+        if phase != self.clear_phase:
+            self.clear_phase = phase
+            for i in self.engine.clearing:
+                self.queue_draw_cells(0, i, self.bw, 1)
 
     def reset_bonus_text(self):
-        self.bonus = 0
-
-    def chk_glass(self):
-        clearlines = []
-        for i in range(self.bh - 1, -1, -1):
-            j = 0
-            while j < self.bw and self.glass[i][j] != 0:
-                j += 1
-            if j >= self.bw:
-                clearlines.append(i)
-                self.bonus_line_Score(i)
-                self.linecount += 1
-                for j in range(self.bw):
-                    self.glass[i][j] = -self.glass[i][j]
-        if len(clearlines) > 0:
-            self.make_sound('boom.au')
-            for i in clearlines:
-                for j in range(self.bw):
-                    self.glass[i][j] = 0
-            self.queue_draw_glass(True)
-            time.sleep(self.time_step)
-            self.next_tick += self.time_step * 2
-        for i in clearlines:
-            tmp = self.glass[i]
-            for ii in range(i, self.bh - 1):
-                self.glass[ii] = self.glass[ii + 1]
-            self.glass[self.bh - 1] = tmp
+        self.engine.bonus = 0
 
     def draw_background(self, cairo_ctx):
         cairo_ctx.set_source_rgb(self.color_back.red,
@@ -472,52 +747,248 @@ class BlockParty:
             self.xnext, self.ynext, self.bwpx * 5, self.bhpx * 5 + 50)
 
     def queue_draw_glass(self, redraw):
-        if redraw:
+        boxes = self.piece_boxes(self.engine)
+        if redraw or self.view_boxes is None:
             self.da.queue_draw_area(
                 self.xshift - self.bwpx / 2, self.yshift,
                 self.bwpx * (self.bw + 1), self.bhpx * self.bh + self.bhpx / 2)
         else:
-            # TODO: Only update the block since nothing else changed
-            self.da.queue_draw_area(
-                self.xshift - self.bwpx / 2, self.yshift,
-                self.bwpx * (self.bw + 1), self.bhpx * self.bh + self.bhpx / 2)
+            # invalidate where the piece and its ghost were and now are
+            for box in set(self.view_boxes + boxes):
+                self.queue_draw_cells(*box)
+        self.view_boxes = boxes
+
+    def queue_draw_cells(self, x, y, w, h):
+        self.da.queue_draw_area(
+            self.xshift + x * self.bwpx,
+            self.yshift + (self.bh - y - h) * self.bhpx,
+            w * self.bwpx, h * self.bhpx)
+
+    def piece_boxes(self, eng):
+        # cell rectangles (x, y, w, h) of the piece and of its ghost
+        shape = eng.shape
+        boxes = []
+        for py in (eng.py, eng.ghost_py()):
+            top = min(py + shape.top, eng.bh - 1)
+            if py + shape.bottom <= top:
+                boxes.append((eng.px + shape.left, py + shape.bottom,
+                              shape.right - shape.left + 1,
+                              top - py - shape.bottom + 1))
+        return boxes
+
+    def glass_clip(self, clip):
+        return clip.x >= self.xshift and clip.y >= self.yshift and \
+            clip.x + clip.width <= self.xshift + self.bw * self.bwpx and \
+            clip.y + clip.height <= self.yshift + self.bh * self.bhpx
 
     def update_picture(self, cairo_ctx):
-        self.view_glass = None
-        self.draw_background(cairo_ctx)
+        clip = Gdk.cairo_get_clip_rectangle(cairo_ctx)[1]
+        self.stats.frame()
+        self.stats.add('area', clip.width * clip.height)
+        if self.versus is not None:
+            self.versus.draw(cairo_ctx, clip)
+            if self.show_stats:
+                self.draw_stats(cairo_ctx)
+            return
+        self.draw_static(cairo_ctx)
+        if self.glass_clip(clip):
+            # a piece moved, nothing outside the glass needs painting
+            self.draw_glass(cairo_ctx, clip)
+            self.draw_poster(cairo_ctx)
+            return
+
         self.draw_score(cairo_ctx)
-        self.draw_escape(cairo_ctx)
+        self.draw_glass(cairo_ctx, clip)
+        self.draw_poster(cairo_ctx)
+        self.draw_next(cairo_ctx)
+        if self.show_stats:
+            self.draw_stats(cairo_ctx)
+
+    def draw_stats(self, cairo_ctx):
+        frame = self.stats.histograms['update_picture']
+        drift = self.stats.histograms['tick_drift']
+        text = 'fps %.1f\nframe p50 %.1f p99 %.1f ms\n' \
+            'drift p50 %.1f p99 %.1f ms' % (
+                self.stats.fps(),
+                frame.percentile(50) * 1000, frame.percentile(99) * 1000,
+                drift.percentile(50) * 1000, drift.percentile(99) * 1000)
+        cairo_ctx.set_source_rgb(self.color_ui_text.red,
+                                 self.color_ui_text.green,
+                                 self.color_ui_text.blue)
+        self.draw_string(cairo_ctx, text, self.scorex, self.bhpx, False)
+        cairo_ctx.fill()
 
-        self.draw_glass(cairo_ctx)
+    def draw_static(self, cairo_ctx):
+        # background, frames and labels never change between frames, so
+        # they are painted once and then copied
+        if self.static_surface is None:
+            self.static_surface = self.da.get_window().create_similar_surface(
+                cairo.CONTENT_COLOR, self.window_w, self.window_h)
+            static_ctx = cairo.Context(self.static_surface)
+            self.draw_background(static_ctx)
+            self.draw_escape(static_ctx)
+            self.draw_next_frame(static_ctx)
+        cairo_ctx.set_source_surface(self.static_surface, 0, 0)
+        cairo_ctx.paint()
+
+    def set_geometry(self, width, height):
+        # everything derived from the size of the drawing area, in
+        # logical pixels; the static surface is created at the device
+        # scale, so high density screens are not drawn at twice the work
+        if (width, height) == (self.window_w, self.window_h):
+            return False
+        self.window_w = width
+        self.window_h = height
+        self.bwpx = int(self.window_w / (self.bw + self.bw / 2 + 2))
+        self.bhpx = int(self.window_h / (self.bh + 2))
+        self.bwpx = self.bhpx = max(1, min(self.bwpx, self.bhpx))
+        self.xshift = int((self.window_w - (self.bw + 1) * self.bwpx) / 2)
+        self.yshift = int((self.window_h - (self.bh + 1) * self.bhpx) / 2)
+        self.xnext = self.window_w - self.xshift / \
+            2 - min(self.xshift / 2, 100)
+        self.ynext = self.window_h / 2 - min(self.window_h / 2, 200)
+
+        self.scorex = self.xshift / 2 - min(self.xshift / 2, 150)
+        self.scorey = self.window_h / 2 - min(self.window_h / 2, 100)
+
+        self.font.set_size(
+            max(1, int(self.window_w * self.font_size * Pango.SCALE / 900)))
+        self.static_surface = None
+        self.layouts.clear()
+        self.view_boxes = None
+        return True
+
+    def size_allocate_cb(self, widget, allocation):
+        if self.set_geometry(allocation.width, allocation.height):
+            self.da.queue_draw()
+
+    def static_changed_cb(self, widget, *args):
+        self.static_surface = None
+        if self.versus is not None:
+            self.versus.static_surface = None
+        self.layouts.clear()
+        self.da.queue_draw()
+
+    def draw_poster(self, cairo_ctx):
         if self.game_mode is self.GAME_OVER:
             self.draw_game_end_poster(cairo_ctx)
         if self.game_mode is self.SELECT_LEVEL:
             self.draw_select_level_poster(cairo_ctx)
-
-        self.draw_next(cairo_ctx)
+        if self.game_mode is self.PAUSED:
+            self.draw_paused_poster(cairo_ctx)
+        if self.autoplayer is not None:
+            self.draw_demo_poster(cairo_ctx)
 
     def keypress_cb(self, widget, event):
         self.key_action(Gdk.keyval_name(event.keyval))
+        self.schedule()
 
     def keyrelease_cb(self, widget, event):
         key = Gdk.keyval_name(event.keyval)
+        if self.versus is not None:
+            self.versus.key_release(key)
+            return
+        if self.player is not None:
+            return
         if key in self.speed_key:
-            self.set_time_step()
-            self.can_speed_up = True
+            self.engine.slow_down()
+        action = self.key_to_action(key)
+        if action is not None:
+            self.keys.release(action)
+
+    def focus_out_cb(self, widget, event):
+        if self.versus is not None:
+            self.versus.release_all()
+            return
+        if self.player is not None:
+            return
+        self.keys.release_all()
+        self.engine.slow_down()
+
+    def schedule(self):
+        # wake exactly at the next thing due, or not at all
+        if self.timer_id is not None:
+            GLib.source_remove(self.timer_id)
+            self.timer_id = None
+        deadlines = []
+        if self.vanishing_cursor is not None:
+            deadlines.append(self.vanishing_cursor.deadline())
+        if self.show_stats:
+            deadlines.append(self.stats_due)
+        if self.game_mode == self.SELECT_LEVEL and autoplay.AVAILABLE:
+            deadlines.append(self.idle_since + self.demo_delay)
+        if self.versus is not None:
+            deadlines.extend(self.versus.deadlines())
+        if self.game_mode == self.PLAY:
+            deadlines.append(self.next_tick)
+            deadlines.append(self.keys.deadline())
+            if self.engine.clearing:
+                flash = self.clear_flash_time
+                deadlines.append(
+                    self.clear_start + (self.clear_phase + 1) * flash)
+        deadlines = [d for d in deadlines if d is not None]
+        if not deadlines:
+            return
+        delay = math.ceil((min(deadlines) - time.time()) * 1000)
+        self.timer_id = GLib.timeout_add(max(0, delay), self.timer_cb)
 
     def timer_cb(self):
+        self.timer_id = None
         self.vanishing_cursor.time_event()
-        while self.game_mode == self.PLAY and time.time() >= self.next_tick:
-            self.next_tick += self.time_step
-            self.tick()
-        if self.game_mode != self.PLAY:
-            self.next_tick = time.time() + 100
-        return True
+        due = self.keys.deadline()
+        if due is not None and time.time() >= due:
+            self.process_input()
+        if self.game_mode == self.SELECT_LEVEL and autoplay.AVAILABLE and \
+           time.time() >= self.idle_since + self.demo_delay:
+            self.start_demo()
+        if self.versus is not None:
+            self.versus.timer(time.time())
+        if self.game_mode == self.PLAY:
+            self.next_tick = self.catch_up(
+                self.engine, self.next_tick, self.tick,
+                lambda: self.game_mode == self.PLAY)
+        if self.engine.clearing:
+            self.animate_clear()
+        if self.show_stats and time.time() >= self.stats_due:
+            self.stats_due = time.time() + 1
+            self.queue_draw_score()
+        self.schedule()
+        return False
+
+    def catch_up(self, eng, due, tick, running):
+        # calls tick() for every time step of eng due by now while
+        # running() holds, and returns when the next one is due
+        ticks = 0
+        while running() and time.time() >= due:
+            if ticks == self.max_catchup_ticks:
+                # too far behind, drop the backlog rather than spiral
+                return time.time() + eng.time_step
+            self.stats.add('tick_drift', time.time() - due)
+            due += eng.time_step
+            tick()
+            ticks += 1
+        return due
+
+    def get_layout(self, cairo_ctx, string, font=None):
+        # layouts are shared by every font in use, see versus.py
+        font = font or self.font
+        key = (string, font.to_string(),
+               cairo_ctx.get_font_options().hash())
+        pl = self.layouts.get(key)
+        if pl is None:
+            pl = PangoCairo.create_layout(cairo_ctx)
+            pl.set_text(string, -1)
+            pl.set_font_description(font)
+            self.layouts[key] = pl
+            if len(self.layouts) > self.max_layouts:
+                self.layouts.popitem(last=False)
+        else:
+            self.layouts.move_to_end(key)
+            PangoCairo.update_layout(cairo_ctx, pl)
+        return pl
 
-    def draw_string(self, cairo_ctx, string, x, y, is_center):
-        pl = PangoCairo.create_layout(cairo_ctx)
-        pl.set_text(string, -1)
-        pl.set_font_description(self.font)
+    def draw_string(self, cairo_ctx, string, x, y, is_center, font=None):
+        pl = self.get_layout(cairo_ctx, string, font)
         width = pl.get_size()[0] / Pango.SCALE
 
         if is_center:
@@ -527,7 +998,6 @@ class BlockParty:
         PangoCairo.layout_path(cairo_ctx, pl)
 
     def draw_game_end_poster(self, cairo_ctx):
-        self.save_highscore()
         cairo_ctx.set_source_rgb(self.colors[0].red,
                                  self.colors[0].green,
                                  self.colors[0].blue)
@@ -546,35 +1016,46 @@ class BlockParty:
             cairo_ctx, 'Enter to play again',
             self.xshift + (self.bwpx * self.bw) / 2,
             self.yshift + (self.bh / 2 + 1) * self.bhpx, True)
+        if self.history is not None:
+            self.draw_string(
+                cairo_ctx, 'Z to undo',
+                self.xshift + (self.bwpx * self.bw) / 2,
+                self.yshift + (self.bh / 2 + 2) * self.bhpx, True)
         cairo_ctx.fill()
 
-    def draw_score(self, cairo_ctx):
-        if self.score_path is not None:
+    def get_score_text(self):
+        eng = self.engine
+        hscore = self.hscore if self.scores is not None else None
+        key = (hscore, eng.score, eng.level, eng.linecount, eng.bonus)
+        if key == self.score_key:
+            return self.score_text
+
+        if self.scores is not None:
             displaystr = 'HighScore: ' + str(self.hscore)
         else:
             displaystr = ''
-        displaystr += '\nScore: ' + str(self.score)
-        displaystr += '\nLevel: ' + str(self.level)
-        displaystr += '\nLines: ' + str(self.linecount)
+        displaystr += '\nScore: ' + str(eng.score)
+        displaystr += '\nLevel: ' + str(eng.level)
+        displaystr += '\nLines: ' + str(eng.linecount)
+
+        if eng.bonus > 0:
+            displaystr += '\n\nBonus: +' + str(eng.bonus)
 
-        if self.bonus > 0:
-            displaystr += '\n\nBonus: +' + str(self.bonus)
+        self.score_key = key
+        self.score_text = displaystr
+        return displaystr
 
+    def draw_score(self, cairo_ctx):
         cairo_ctx.set_source_rgb(self.color_ui_text.red,
                                  self.color_ui_text.green,
                                  self.color_ui_text.blue)
         self.draw_string(
-            cairo_ctx, displaystr, self.scorex, self.scorey, False)
+            cairo_ctx, self.get_score_text(), self.scorex, self.scorey, False)
         cairo_ctx.fill()
 
     def set_level(self, new_level):
-        self.level = new_level
-        if self.level < 0:
-            self.level = 0
-        if self.level > 9:
-            self.level = 9
-        self.set_time_step()
-        self.next_tick = time.time() + self.time_step
+        self.engine.set_level(new_level)
+        self.next_tick = time.time() + self.engine.time_step
 
     def draw_select_level_poster(self, cairo_ctx):
 
@@ -591,21 +1072,48 @@ class BlockParty:
             self.xshift + (self.bwpx * self.bw) / 2,
             self.yshift + (self.bh / 2 - 2) * self.bhpx, True)
         self.draw_string(
-            cairo_ctx, 'LEVEL: ' + str(self.level),
+            cairo_ctx, 'LEVEL: ' + str(self.engine.level),
             self.xshift + (self.bwpx * self.bw) / 2,
             self.yshift + (self.bh / 2) * self.bhpx, True)
         self.draw_string(
             cairo_ctx, 'Enter to start',
             self.xshift + (self.bwpx * self.bw) / 2,
             self.yshift + (self.bh / 2 + 2) * self.bhpx, True)
+        self.draw_string(
+            cairo_ctx, '2, 3 or 4 for versus',
+            self.xshift + (self.bwpx * self.bw) / 2,
+            self.yshift + (self.bh / 2 + 4) * self.bhpx, True)
+        self.draw_string(
+            cairo_ctx, 'T to practice',
+            self.xshift + (self.bwpx * self.bw) / 2,
+            self.yshift + (self.bh / 2 + 6) * self.bhpx, True)
+        cairo_ctx.fill()
+
+    def draw_paused_poster(self, cairo_ctx):
+        cairo_ctx.set_source_rgb(self.color_score.red,
+                                 self.colors[0].green,
+                                 self.color_score.blue)
+        self.draw_string(
+            cairo_ctx, 'Paused',
+            self.xshift + (self.bwpx * self.bw) / 2,
+            self.yshift + (self.bh / 2 - 1) * self.bhpx, True)
+        self.draw_string(
+            cairo_ctx, 'Press any key',
+            self.xshift + (self.bwpx * self.bw) / 2,
+            self.yshift + (self.bh / 2 + 1) * self.bhpx, True)
         cairo_ctx.fill()
 
-    def clear_glass(self):
-        for i in range(self.bh):
-            for j in range(self.bw):
-                self.glass[i][j] = 0
+    def draw_demo_poster(self, cairo_ctx):
+        cairo_ctx.set_source_rgb(self.color_score.red,
+                                 self.colors[0].green,
+                                 self.color_score.blue)
+        self.draw_string(
+            cairo_ctx, 'Demo - press any key',
+            self.xshift + (self.bwpx * self.bw) / 2,
+            self.yshift + 2 * self.bhpx, True)
+        cairo_ctx.fill()
 
-    def draw_next(self, cairo_ctx):
+    def draw_next_frame(self, cairo_ctx):
         cairo_ctx.set_line_width(1)
         cairo_ctx.set_source_rgb(self.color_ui_text.red,
                                  self.color_ui_text.green,
@@ -625,16 +1133,16 @@ class BlockParty:
         cairo_ctx.rectangle(
             self.xnext + self.bwpx / 4, self.ynext + 50 + self.bhpx / 4, self.bwpx * 4.5, self.bhpx * 4.5)
         cairo_ctx.fill()
-        for i in range(4):
-            for j in range(4):
-                if self.next_figure[i][j] != 0:
-                    color = self.colors[self.next_figure[i][j]]
-                    cairo_ctx.set_source_rgb(
-                        color.red, color.green, color.blue)
-                    cairo_ctx.rectangle(
-                        self.xnext + j * self.bwpx + self.bwpx / 2,
-                        self.ynext + 50 + (3 - i) * self.bhpx + self.bhpx / 2,
-                        self.bwpx - self.gridwidth, self.bhpx - self.gridwidth)
+
+    def draw_next(self, cairo_ctx):
+        for i, j, c in self.engine.next_shape.cells:
+            color = self.colors[c]
+            cairo_ctx.set_source_rgb(
+                color.red, color.green, color.blue)
+            cairo_ctx.rectangle(
+                self.xnext + j * self.bwpx + self.bwpx / 2,
+                self.ynext + 50 + (3 - i) * self.bhpx + self.bhpx / 2,
+                self.bwpx - self.gridwidth, self.bhpx - self.gridwidth)
         cairo_ctx.fill()
 
     def draw_escape(self, cairo_ctx):
@@ -648,37 +1156,55 @@ class BlockParty:
             self.xnext + self.bwpx * 2.5, self.window_h - 4 * self.bhpx, True)
         cairo_ctx.fill()
 
+    def sound_path(self, filename):
+        return os.path.abspath(os.path.join('sounds', filename))
+
     def make_sound(self, filename):
-        filename = os.path.abspath(os.path.join('sounds', filename))
-        if self.sound:
-            self.audioplayer.play(filename)
+        if self.sound and self.autoplayer is None:
+            self.audioplayer.play(self.sound_path(filename),
+                                  self.sounds[filename])
 
     def close(self):
-        if self.timer_id != None:
+        self.dump_stats()
+        if self.timer_id is not None:
             GLib.source_remove(self.timer_id)
+            self.timer_id = None
+        if self.input_id is not None:
+            GLib.source_remove(self.input_id)
+            self.input_id = None
+        if self.hint_id is not None:
+            GLib.source_remove(self.hint_id)
+            self.hint_id = None
+        if self.network_id is not None:
+            GLib.source_remove(self.network_id)
+            self.network_id = None
+        if self.versus is not None:
+            self.versus.close()
+        if self.transport is not None:
+            self.transport.close()
         self.audioplayer.close()
 
-    def read_highscore(self):
-        try:
-            with open(self.score_path, "r") as fp:
-                return int(fp.readline())
-        except (FileNotFoundError, ValueError, IndexError):
-            return 0
-
-    def save_highscore(self):
-        if self.score > self.read_highscore():
-            try:
-                with open(self.score_path, "w") as fp:
-                    fp.writelines([str(self.score)])
-            except PermissionError:
-                pass
-
 
 def main():
+    parser = argparse.ArgumentParser(description='Block Party')
+    parser.add_argument('--port', type=int,
+                        help='play shared games over UDP on this port')
+    parser.add_argument('--peer', action='append', default=[],
+                        metavar='HOST:PORT', help='another player')
+    args = parser.parse_args()
+
     win = Gtk.Window(Gtk.WindowType.TOPLEVEL)
     da = Gtk.DrawingArea()
-    BlockParty(win, da)
+    game = BlockParty(win, da)
+    if args.port is not None:
+        peers = []
+        for peer in args.peer:
+            host, port = peer.rsplit(':', 1)
+            peers.append((host, int(port)))
+        game.set_transport(network.SocketTransport(args.port, peers))
+        game.shared = bool(peers)
     win.add(da)
+    win.maximize()
     win.show_all()
     Gtk.main()
 
@@ -29,6 +29,7 @@ gi.require_version('Gdk', '3.0')
 from gi.repository import Gtk
 
 from BlockParty import BlockParty
+import network
 
 from sugar3.activity import activity
 from sugar3.graphics import style
@@ -40,11 +41,12 @@ from sugar3.activity.widgets import ShareButton
 from sugar3.activity.widgets import DescriptionItem
 from sugar3.activity.activity import get_activity_root
 
+
 class BlockPartyActivity(activity.Activity):
     def __init__(self, handle):
         activity.Activity.__init__(self, handle)
 
-        self.max_participants = 1
+        self.max_participants = 4
 
         toolbar_box = ToolbarBox()
 
@@ -57,16 +59,16 @@ class BlockPartyActivity(activity.Activity):
         title_entry.show()
 
         score_path = os.path.join(get_activity_root(), 'data', 'highscore')
+        replay_path = os.path.join(get_activity_root(), 'data', 'lastgame.bpr')
 
         self.metadata['description'] = "Strategically rotate, move, and drop the blocks. \nAttempt to clear as many lines as possible by completing horizontal rows of blocks without empty space.\n\nLeft/right arrow keys: Rotate block\nDown arrow key: Speed up block.\nSpace: Drop the block.\nS key: Toggle sound"
         description_item = DescriptionItem(self)
         toolbar_box.toolbar.insert(description_item, -1)
         description_item.show()
 
-        if self.max_participants > 1:
-            share_button = ShareButton(self)
-            toolbar_box.toolbar.insert(share_button, -1)
-            share_button.show()
+        share_button = ShareButton(self)
+        toolbar_box.toolbar.insert(share_button, -1)
+        share_button.show()
 
         separator = Gtk.SeparatorToolItem()
         separator.props.draw = False
@@ -85,10 +87,38 @@ class BlockPartyActivity(activity.Activity):
         self.block_party = BlockParty(
             self, canvas,
             font_face=style.FONT_FACE, font_size=style.FONT_SIZE * 2,
-            gcs=style.GRID_CELL_SIZE, score_path=score_path)
+            gcs=style.GRID_CELL_SIZE, score_path=score_path,
+            replay_path=replay_path)
         self.set_canvas(canvas)
         canvas.show()
 
+        self.connect('shared', self._shared_cb)
+        if self.shared_activity is not None:
+            # launched to join someone else's activity
+            if self.get_shared():
+                self._shared_cb(self)
+            else:
+                self.connect('joined', self._shared_cb)
+
+    def _shared_cb(self, activity):
+        if self.block_party.transport is not None:
+            return
+        self.block_party.set_transport(network.TextChannelTransport(
+            self.shared_activity.telepathy_text_chan))
+        self.block_party.shared = True
+
+    def read_file(self, file_path):
+        with open(file_path, 'rb') as fp:
+            data = fp.read()
+        if data:
+            self.block_party.resume_game(data)
+
+    def write_file(self, file_path):
+        # the game in progress, resumed paused when the entry is opened
+        data = self.block_party.save_game() or b''
+        with open(file_path, 'wb') as fp:
+            fp.write(data)
+
     def close(self, **kwargs):
         self.block_party.close()
         activity.Activity.close(self, **kwargs)
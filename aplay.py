@@ -16,7 +16,7 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
 import logging
-from queue import Queue
+import time
 import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst
@@ -26,6 +26,12 @@ Gst.init(None)
 
 
 class Aplay:
+
+    # sounds waiting longer than max_delay seconds are no longer worth
+    # playing
+    max_pending = 4
+    max_delay = 0.5
+
     def __init__(self):
         pipeline = Gst.ElementFactory.make('playbin', 'playbin')
         pipeline.set_property(
@@ -38,14 +44,28 @@ class Aplay:
         bus.connect('message::error', self._on_message_error)
 
         self._pipeline = pipeline
-        self._queue = Queue()
+        # [priority, time queued, name]
+        self._pending = []
+        # (priority, name) while the pipeline is playing, as last known
+        # from our own requests and bus messages, never queried
+        self._playing = None
 
-    def _dequeue(self):
-        if self._queue.empty():
-            return
-        name = self._queue.get()
+    def _start(self, priority, name):
+        self._pipeline.set_state(Gst.State.NULL)
         self._pipeline.props.uri = 'file://' + name
         self._pipeline.set_state(Gst.State.PLAYING)
+        self._playing = (priority, name)
+
+    def _dequeue(self):
+        self._playing = None
+        now = time.time()
+        self._pending = [entry for entry in self._pending
+                         if now - entry[1] <= self.max_delay]
+        if not self._pending:
+            return
+        entry = max(self._pending, key=lambda entry: (entry[0], -entry[1]))
+        self._pending.remove(entry)
+        self._start(entry[0], entry[2])
 
     def _on_message_eos(self, bus, message):
         if self._pipeline:
@@ -58,13 +78,24 @@ class Aplay:
         self._pipeline.set_state(Gst.State.NULL)
         self._dequeue()
 
-    def play(self, name):
-        self._queue.put(name)
-        if self._pipeline:
-            if self._pipeline.get_state(Gst.CLOCK_TIME_NONE)[1] == Gst.State.NULL:
-                self._dequeue()
+    def play(self, name, priority=0):
+        if not self._pipeline:
+            return
+        if self._playing is None or priority > self._playing[0]:
+            self._start(priority, name)
+            return
+        for entry in self._pending:
+            if entry[2] == name:
+                entry[0] = max(entry[0], priority)
+                return
+        if len(self._pending) >= self.max_pending:
+            lowest = min(self._pending,
+                         key=lambda entry: (entry[0], entry[1]))
+            if lowest[0] > priority:
+                return
+            self._pending.remove(lowest)
+        self._pending.append([priority, time.time(), name])
 
     def close(self):
         self._pipeline.set_state(Gst.State.NULL)
         self._pipeline = None
-
@@ -0,0 +1,189 @@
+#
+# Copyright (c) 2026 Sugar Labs
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+#  A computer player.  Every rotation and column of the current figure
+#  is dropped onto the glass, optionally followed by every placement of
+#  the next figure, and the resulting boards are scored together as
+#  NumPy arrays.  NumPy is optional; without it there is no autoplayer.
+
+import engine
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+AVAILABLE = numpy is not None
+
+# aggregate height, lines cleared, holes, bumpiness
+WEIGHTS = (-0.510066, 0.760666, -0.35663, -0.184483)
+
+
+class Placement:
+
+    # one orientation of a figure at every column it fits in
+
+    def __init__(self, rotation, shape, bw):
+        self.rotation = rotation
+        self.top = shape.top
+        self.bottom = shape.bottom
+        self.px = numpy.arange(-shape.left, bw - shape.right)
+        cols = numpy.array([col for col, low, high in shape.columns])
+        self.lows = numpy.array([low for col, low, high in shape.columns])
+        # glass columns under each shape column, (positions, columns)
+        self.under = self.px[:, None] + cols[None, :]
+        self.cell_rows = numpy.array([i for i, j, c in shape.cells])
+        # glass columns of each cell, (positions, cells)
+        self.cell_cols = self.px[:, None] + \
+            numpy.array([j for i, j, c in shape.cells])[None, :]
+
+
+def bits(rows, bw):
+    # glass row bitmasks as a (rows, columns) array of booleans
+    rows = numpy.array(rows, dtype=numpy.int64)
+    return (rows[:, None] >> numpy.arange(bw)) & 1 == 1
+
+
+def column_heights(boards):
+    bh = boards.shape[1]
+    return (boards * numpy.arange(1, bh + 1)[:, None]).max(axis=1)
+
+
+def clear_rows(boards):
+    # full rows of each board removed and the rows above moved down
+    full = boards.all(axis=2)
+    order = numpy.argsort(full, axis=1, kind='stable')
+    cleared = numpy.take_along_axis(boards, order[:, :, None], axis=1)
+    lines = full.sum(axis=1)
+    keep = numpy.arange(boards.shape[1])[None, :] < \
+        boards.shape[1] - lines[:, None]
+    return cleared & keep[:, :, None], lines
+
+
+def evaluate(boards, lines, weights=WEIGHTS):
+    heights = column_heights(boards)
+    aggregate = heights.sum(axis=1)
+    holes = aggregate - boards.sum(axis=(1, 2))
+    bumpiness = numpy.abs(numpy.diff(heights, axis=1)).sum(axis=1)
+    a, b, c, d = weights
+    return a * aggregate + b * lines + c * holes + d * bumpiness
+
+
+class AutoPlayer:
+
+    def __init__(self, eng, lookahead=True, weights=WEIGHTS):
+        self.engine = eng
+        self.lookahead = lookahead
+        self.weights = tuple(weights)
+        self.placements = {}
+
+    def get_placements(self, figure, rotation=0):
+        # distinct orientations, the ones needing fewer turns first
+        key = (figure, rotation)
+        if key not in self.placements:
+            seen = set()
+            placements = []
+            for turns in range(4):
+                r = (rotation + turns) % 4
+                shape = engine.ORIENTATIONS[figure][r]
+                cells = frozenset((i, j) for i, j, c in shape.cells)
+                if cells not in seen:
+                    seen.add(cells)
+                    placements.append(Placement(r, shape, self.engine.bw))
+            self.placements[key] = placements
+        return self.placements[key]
+
+    def expand(self, boards, placements):
+        # every placement on every board, as (boards * positions) boards
+        # after clearing, with the lines cleared, whether the figure stayed
+        # inside the glass and the (rotation, px) used
+        count, bh, bw = boards.shape
+        heights = column_heights(boards)
+        children = []
+        inside = []
+        moves = []
+        for p in placements:
+            land = (heights[:, p.under] - p.lows).max(axis=2)
+            land = numpy.maximum(land, -p.bottom)
+            inside.append(land + p.top < bh)
+            rows = numpy.minimum(land[:, :, None] + p.cell_rows, bh - 1)
+            child = numpy.repeat(boards[:, None], len(p.px), axis=1)
+            index = numpy.indices(rows.shape)
+            child[index[0], index[1], rows,
+                  numpy.broadcast_to(p.cell_cols, rows.shape)] = True
+            children.append(child)
+            moves.extend((p.rotation, int(px)) for px in p.px)
+        children = numpy.concatenate(children, axis=1).reshape(-1, bh, bw)
+        inside = numpy.concatenate(inside, axis=1).reshape(-1)
+        children, lines = clear_rows(children)
+        return children, lines, inside, moves
+
+    def search(self, rows, figure, rotation=0, next_figure=None):
+        # a generator pausing after each orientation of the figure, so
+        # the search can be spread over several calls; returns the best
+        # (rotation, px), or None if nothing fits
+        board = bits(rows, self.engine.bw)[None]
+        best_score = -numpy.inf
+        best = None
+        for placement in self.get_placements(figure, rotation):
+            boards, lines, inside, moves = self.expand(board, [placement])
+            if next_figure is not None:
+                after, more, fits, unused = self.expand(
+                    boards, self.get_placements(next_figure))
+                total = numpy.repeat(lines, len(unused)) + more
+                scores = evaluate(after, total, self.weights)
+                scores[~fits] = -numpy.inf
+                scores = scores.reshape(len(moves), -1).max(axis=1)
+            else:
+                scores = evaluate(boards, lines, self.weights)
+            scores[~inside] = -numpy.inf
+            i = int(numpy.argmax(scores))
+            if scores[i] > best_score:
+                best_score = scores[i]
+                best = moves[i]
+            yield
+        return best
+
+    def best_move(self):
+        # (rotation, px) for the current figure, None if nothing fits
+        eng = self.engine
+        search = self.search(eng.rows, eng.figure, eng.rotation,
+                             eng.next_figure if self.lookahead else None)
+        while True:
+            try:
+                next(search)
+            except StopIteration as stop:
+                return stop.value
+
+    def plan(self):
+        # the actions that take the current figure to its best place
+        move = self.best_move()
+        if move is None:
+            return [engine.DROP]
+        rotation, px = move
+        actions = [engine.ROTATE] * ((rotation - self.engine.rotation) % 4)
+        dx = px - self.engine.px
+        actions += [engine.RIGHT if dx > 0 else engine.LEFT] * abs(dx)
+        actions.append(engine.DROP)
+        return actions
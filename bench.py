@@ -0,0 +1,382 @@
+#
+# Copyright (c) 2026 Sugar Labs
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+#  Benchmarks of the engine and renderer hot paths, runnable without a
+#  display.
+#
+#    python3 bench.py -o before.json
+#    python3 bench.py -o after.json --compare before.json
+#
+#  Each benchmark reports the best and median time per call over a
+#  number of repeats.  With --compare, benchmarks whose best time grew
+#  by more than --threshold are reported and the exit status is 1.
+
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+import engine
+import savegame
+import undo
+
+SEED = 1234
+RESOLUTIONS = ((800, 600), (1200, 900), (1920, 1080))
+
+
+def measure(fn, number, repeat):
+    clock = time.perf_counter
+    times = []
+    # like timeit, keep the collector from landing in random repeats
+    gc.disable()
+    try:
+        for i in range(repeat):
+            start = clock()
+            for j in range(number):
+                fn()
+            times.append((clock() - start) / number)
+    finally:
+        gc.enable()
+    return {
+        'best': min(times),
+        'median': statistics.median(times),
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def midgame(seed=SEED, height=8):
+    # an engine with a ragged stack of about `height` rows and a piece
+    # spawned above it
+    eng = engine.Engine(seed=seed)
+    rng = random.Random(seed)
+    for i in range(height):
+        hole = rng.randrange(eng.bw)
+        for j in range(eng.bw):
+            if j != hole and rng.random() < 0.8:
+                eng.rows[i] |= 1 << j
+                eng.glass[i][j] = rng.randint(1, 7)
+    eng.update_heights()
+    eng.glass_version += 1
+    return eng
+
+
+def with_full_rows(lines, seed=SEED):
+    # the last figure locked at the bottom, completing `lines` rows
+    eng = midgame(seed, height=4)
+    for i in range(lines):
+        eng.rows[i] = eng.full
+        for j in range(eng.bw):
+            eng.glass[i][j] = eng.glass[i][j] or 1
+    eng.update_heights()
+    eng.glass_version += 1
+    eng.lock_py = 0
+    return eng
+
+
+def bench_figure_fits():
+    eng = midgame()
+    return eng.figure_fits
+
+
+def bench_rotate_figure_ccw():
+    eng = midgame()
+
+    def run():
+        eng.rotate_figure_ccw(True)
+    return run
+
+
+def bench_drop_figure():
+    eng = midgame()
+    top = eng.py
+
+    def run():
+        eng.py = top
+        # a new glass version, so the landing search is not cached
+        eng.glass_version += 1
+        eng.drop_figure()
+    return run
+
+
+def bench_chk_glass(lines):
+    eng = with_full_rows(lines)
+
+    def run():
+        # only detects and scores the rows, the glass is left as it is
+        eng.chk_glass()
+    return run
+
+
+def bench_clear(lines):
+    eng = with_full_rows(lines)
+    rows = list(eng.rows)
+    glass = [bytes(row) for row in eng.glass]
+
+    def run():
+        eng.rows[:] = rows
+        for row, saved in zip(eng.glass, glass):
+            row[:] = saved
+        eng.chk_glass()
+        eng.finish_clear()
+    return run
+
+
+def bench_tick():
+    # a game with no input, restarted from the same seed when it ends
+    eng = engine.Engine(seed=SEED)
+    eng.set_level(9)
+
+    def run():
+        for i in range(100):
+            if eng.game_over:
+                eng.reset(level=9, seed=SEED)
+            eng.tick()
+    return run
+
+
+def bench_savegame_encode():
+    eng = midgame()
+    return lambda: savegame.encode(eng)
+
+
+def bench_savegame_decode():
+    data = savegame.encode(midgame())
+    eng = engine.Engine()
+    return lambda: savegame.decode(eng, data)
+
+
+def bench_undo_capture():
+    history = undo.History(midgame())
+    return history.capture
+
+
+def bench_undo_restore():
+    # back and forth between two captured states
+    history = undo.History(midgame())
+    history.capture()
+    history.capture()
+
+    def run():
+        history.undo()
+        history.redo()
+    return run
+
+
+def bench_autoplay(lookahead):
+    import autoplay
+    if not autoplay.AVAILABLE:
+        raise ImportError('No module named numpy')
+    player = autoplay.AutoPlayer(midgame(), lookahead)
+    return player.plan
+
+
+class OffscreenArea:
+
+    # enough of a Gtk.Window and Gtk.DrawingArea for BlockParty to
+    # render into image surfaces
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    def get_screen(self):
+        return self
+
+    def get_width(self):
+        return self.width
+
+    def get_height(self):
+        return self.height
+
+    def get_window(self):
+        return self
+
+    def create_similar_surface(self, content, width, height):
+        import cairo
+        return cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+
+    def set_title(self, title):
+        pass
+
+    def connect(self, *args):
+        pass
+
+    def queue_draw(self):
+        pass
+
+    def queue_draw_area(self, x, y, width, height):
+        pass
+
+
+def render_benchmarks(width, height):
+    import cairo
+    from BlockParty import BlockParty
+    from gi.repository import Gdk
+
+    area = OffscreenArea(width, height)
+    game = BlockParty(area, area)
+    game.sound = False
+    game.engine = midgame()
+    game.engine.listener = game.engine_cb
+    game.game_mode = game.PLAY
+    surface = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+    size = '%dx%d' % (width, height)
+
+    def full():
+        cr = cairo.Context(surface)
+        game.update_picture(cr)
+
+    def piece():
+        # the damage of a piece moving one cell down
+        x, y, w, h = game.piece_boxes(game.engine)[0]
+        cr = cairo.Context(surface)
+        cr.rectangle(game.xshift + x * game.bwpx,
+                     game.yshift + (game.bh - y - h - 1) * game.bhpx,
+                     w * game.bwpx, (h + 1) * game.bhpx)
+        cr.clip()
+        game.update_picture(cr)
+
+    clip = Gdk.Rectangle()
+    clip.width, clip.height = width, height
+
+    def glass():
+        cr = cairo.Context(surface)
+        game.draw_glass(cr, clip)
+
+    def glass_per_cell():
+        # the same cells filled one at a time, as before fills were
+        # batched by color, to weigh draw_glass against
+        cr = cairo.Context(surface)
+        batches = {}
+        game.batch_cells(batches, game.engine, game.xshift, game.yshift,
+                         game.bwpx, clip, game.clear_phase)
+        side = game.bwpx - game.gridwidth
+        for color, cells in batches.items():
+            for x, y in cells:
+                cr.set_source_rgba(*game.rgba[color])
+                cr.rectangle(x, y, side, side)
+                cr.fill()
+
+    # paint the static background once, as the first frame does
+    full()
+    return [
+        ('update_picture/full/' + size, full),
+        ('update_picture/piece/' + size, piece),
+        ('draw_glass/' + size, glass),
+        ('draw_glass/per_cell/' + size, glass_per_cell),
+    ]
+
+
+def benchmarks():
+    yield 'figure_fits', bench_figure_fits(), 20000
+    yield 'rotate_figure_ccw', bench_rotate_figure_ccw(), 20000
+    yield 'drop_figure', bench_drop_figure(), 20000
+    for lines in range(1, 5):
+        yield 'chk_glass/%d' % lines, bench_chk_glass(lines), 20000
+        yield 'clear/%d' % lines, bench_clear(lines), 5000
+    yield 'tick/100', bench_tick(), 200
+    yield 'savegame/encode', bench_savegame_encode(), 5000
+    yield 'savegame/decode', bench_savegame_decode(), 2000
+    yield 'undo/capture', bench_undo_capture(), 5000
+    yield 'undo/restore', bench_undo_restore(), 1000
+    try:
+        yield 'autoplay/1', bench_autoplay(False), 500
+        yield 'autoplay/2', bench_autoplay(True), 20
+    except ImportError as e:
+        print('skipping autoplay benchmarks: %s' % e, file=sys.stderr)
+    try:
+        for width, height in RESOLUTIONS:
+            for name, fn in render_benchmarks(width, height):
+                yield name, fn, 20
+    except ImportError as e:
+        print('skipping render benchmarks: %s' % e, file=sys.stderr)
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            print('%-32s %10.2f us   (new)' % (name, result['best'] * 1e6))
+            continue
+        ratio = result['best'] / base['best']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = 'REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = 'faster'
+        print('%-32s %10.2f us %10.2f us %6.2fx %s' % (
+            name, base['best'] * 1e6, result['best'] * 1e6, ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Block Party benchmarks')
+    parser.add_argument('-o', '--output', help='write results to this file')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='compare against an earlier results file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown reported as a regression')
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply the number of calls per repeat')
+    parser.add_argument('-k', dest='match', default='',
+                        help='only run benchmarks whose name contains this')
+    args = parser.parse_args()
+
+    results = {}
+    for name, fn, number in benchmarks():
+        if args.match not in name:
+            continue
+        results[name] = measure(fn, max(1, int(number * args.scale)),
+                                args.repeat)
+        if args.compare is None:
+            print('%-32s %10.2f us' % (name, results[name]['best'] * 1e6))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'time': time.time(),
+                'results': results,
+            }, fp, indent=1, sort_keys=True)
+
+    if args.compare is not None:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print('%d regression(s)' % len(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
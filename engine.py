@@ -0,0 +1,523 @@
+#
+# Copyright (c) 2007 Vadim Gerasimov <vadim@media.mit.edu>
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+#  Block Party game rules, free of any toolkit so that games can be
+#  simulated, tested and benchmarked without a display.
+
+import collections
+import random
+
+# actions accepted by Engine.step()
+LEFT, RIGHT, ROTATE, DROP = 0, 1, 2, 3
+
+# further codes passed to Engine.recorder, for soft drop changes
+SOFT_DROP, SOFT_DROP_OFF = 4, 5
+
+# events passed to Engine.listener
+LOCK, CLEAR, NEXT, GAME_OVER = 0, 1, 2, 3
+
+FIGURES = [
+    [[0, 0, 0, 0],
+     [0, 1, 1, 0],
+     [0, 1, 1, 0],
+     [0, 0, 0, 0]],
+    [[0, 0, 0, 0],
+     [0, 2, 2, 0],
+     [2, 2, 0, 0],
+     [0, 0, 0, 0]],
+    [[0, 0, 0, 0],
+     [3, 3, 0, 0],
+     [0, 3, 3, 0],
+     [0, 0, 0, 0]],
+    [[0, 0, 0, 0],
+     [4, 4, 4, 4],
+     [0, 0, 0, 0],
+     [0, 0, 0, 0]],
+    [[0, 0, 0, 0],
+     [0, 5, 5, 5],
+     [0, 5, 0, 0],
+     [0, 0, 0, 0]],
+    [[0, 0, 0, 0],
+     [6, 6, 6, 0],
+     [0, 6, 0, 0],
+     [0, 0, 0, 0]],
+    [[0, 0, 0, 0],
+     [0, 7, 0, 0],
+     [0, 7, 7, 7],
+     [0, 0, 0, 0]]]
+
+# offsets (dx, dy) tried in order when rotating into an orientation;
+# only the unmoved position is tried for now
+KICKS = ((0, 0),)
+
+Orientation = collections.namedtuple('Orientation', [
+    'cells',    # ((row, col, color), ...) within the 4x4 box
+    'masks',    # ((row, mask), ...) with column left at bit 0
+    'left', 'right', 'bottom', 'top',  # bounding box within the 4x4 box
+    'columns',  # ((col, lowest row, highest row), ...)
+    'kicks',
+])
+
+
+def _rotate_ccw(figure):
+    return [[figure[3 - j][i] for j in range(4)] for i in range(4)]
+
+
+def _orientation(figure):
+    cells = tuple((i, j, figure[i][j])
+                  for i in range(4) for j in range(4) if figure[i][j] != 0)
+    left = min(j for i, j, c in cells)
+    right = max(j for i, j, c in cells)
+    masks = []
+    for i in range(4):
+        mask = 0
+        for ci, cj, c in cells:
+            if ci == i:
+                mask |= 1 << (cj - left)
+        if mask:
+            masks.append((i, mask))
+    columns = []
+    for j in range(left, right + 1):
+        used = [i for i, cj, c in cells if cj == j]
+        if used:
+            columns.append((j, min(used), max(used)))
+    return Orientation(
+        cells, tuple(masks), left, right,
+        min(i for i, j, c in cells), max(i for i, j, c in cells),
+        tuple(columns), KICKS)
+
+
+def _orientations(figure):
+    table = []
+    for i in range(4):
+        table.append(_orientation(figure))
+        figure = _rotate_ccw(figure)
+    return tuple(table)
+
+
+# ORIENTATIONS[figure][rotation] is the figure turned counter-clockwise
+# rotation times
+ORIENTATIONS = tuple(_orientations(figure) for figure in FIGURES)
+
+
+class Engine:
+
+    figures = FIGURES
+
+    def __init__(self, bw=11, bh=20, seed=None, listener=None):
+        self.bw = bw
+        self.bh = bh
+        self.rng = random.Random()
+        # called as listener(event, arg) for LOCK, CLEAR, NEXT, GAME_OVER
+        self.listener = listener
+        # told of every tick and state changing action, see replay.py
+        self.recorder = None
+        self.full = (1 << self.bw) - 1
+        # one bitmask per row for collisions, colors kept alongside
+        self.rows = [0] * self.bh
+        self.glass = [bytearray(self.bw) for i in range(self.bh)]
+        # height of the highest filled cell of each column
+        self.heights = [0] * self.bw
+        # bumped whenever the glass changes, so derived values can be cached
+        self.glass_version = 0
+        self.ghost_key = self.ghost = None
+        # a piece is a figure index, a rotation and a position
+        self.figure = self.rotation = None
+        self.next_figure = self.next_rotation = None
+        self.shape = self.next_shape = None
+        self.px = self.py = 0
+        self.lock_py = 0
+        # full rows shown for one tick before they are removed
+        self.clearing = []
+        self.level = 0
+        self.reset(seed=seed)
+
+    def reset(self, level=5, seed=None):
+        # a game is fully determined by its seed and the actions taken
+        if seed is None:
+            seed = random.randrange(1 << 32)
+        self.seed = seed
+        self.rng.seed(seed)
+        self.dealt = 0
+        self.clear_glass()
+        self.can_speed_up = True
+        self.soft_drop = False
+        self.linecount = 0
+        self.score = 0
+        self.bonus = 0
+        self.figure_score = 0
+        self.game_over = False
+        self.clearing = []
+        self.set_level(level)
+        self.next_figure = self.next_rotation = None
+        self.new_figure()
+
+    def emit(self, event, arg=None):
+        if self.listener is not None:
+            self.listener(event, arg)
+
+    def set_level(self, new_level):
+        self.level = max(0, min(9, new_level))
+        self.set_time_step()
+
+    def set_time_step(self):
+        if self.soft_drop and self.can_speed_up:
+            self.time_step = (9 - self.level) * 0.005
+        else:
+            self.time_step = 0.1 + (9 - self.level) * 0.1
+
+    def speed_up(self):
+        if not self.soft_drop and self.recorder is not None:
+            self.recorder.action(SOFT_DROP)
+        self.soft_drop = True
+        self.set_time_step()
+
+    def slow_down(self):
+        if (self.soft_drop or not self.can_speed_up) and \
+           self.recorder is not None:
+            self.recorder.action(SOFT_DROP_OFF)
+        self.soft_drop = False
+        self.can_speed_up = True
+        self.set_time_step()
+
+    def step(self, action):
+        if self.game_over or self.clearing:
+            return False
+        if action == LEFT:
+            changed = self.move_figure(-1)
+        elif action == RIGHT:
+            changed = self.move_figure(1)
+        elif action == ROTATE:
+            changed = self.rotate_figure_ccw(True)
+        elif action == DROP:
+            changed = self.drop_figure()
+        else:
+            raise ValueError('unknown action %r' % (action,))
+        if changed and self.recorder is not None:
+            self.recorder.action(action)
+        return changed
+
+    def tick(self):
+        if self.game_over:
+            return
+        if self.recorder is not None:
+            self.recorder.tick()
+        if self.clearing:
+            self.finish_clear()
+            return
+        self.py -= 1
+        if self.figure_score > 0:
+            self.figure_score -= 1
+        if self.figure_fits():
+            return
+        self.py += 1
+        self.can_speed_up = False
+        self.set_time_step()
+        self.put_figure()
+        self.emit(LOCK, self.figure_score)
+        self.new_figure()
+        if not self.figure_fits():
+            self.game_over = True
+            if self.recorder is not None:
+                self.recorder.finish()
+            self.emit(GAME_OVER)
+            return
+        self.chk_glass()
+        new_level = self.linecount // 5
+        if new_level > self.level:
+            self.set_level(new_level)
+
+    def deal(self):
+        # the next figure from the game's generator
+        self.dealt += 1
+        return self.rng.randint(0, len(FIGURES) - 1), self.rng.randint(0, 3)
+
+    def skip_figures(self, count):
+        # leave the generator where it is after count more figures, which
+        # restores it without storing its whole state
+        for i in range(count):
+            self.deal()
+
+    def new_figure(self):
+        self.figure_score = self.bh + self.level
+        figure, rotation = self.deal()
+        self.figure, self.next_figure = self.next_figure, figure
+        self.rotation, self.next_rotation = self.next_rotation, rotation
+        self.shape = self.next_shape
+        self.next_shape = ORIENTATIONS[figure][rotation]
+        self.px = self.bw // 2 - 2
+        self.py = self.bh - 3
+        if self.figure is None:
+            self.new_figure()
+        else:
+            self.emit(NEXT)
+
+    def move_figure(self, dx):
+        if not self.fits(self.shape, self.px + dx, self.py):
+            return False
+        self.px += dx
+        return True
+
+    def rotate_figure(self, turn, check_fit):
+        rotation = (self.rotation + turn) % 4
+        shape = ORIENTATIONS[self.figure][rotation]
+        if check_fit:
+            for dx, dy in shape.kicks:
+                if self.fits(shape, self.px + dx, self.py + dy):
+                    self.px += dx
+                    self.py += dy
+                    break
+            else:
+                return False
+        self.rotation = rotation
+        self.shape = shape
+        return True
+
+    def rotate_figure_cw(self, check_fit):
+        return self.rotate_figure(-1, check_fit)
+
+    def rotate_figure_ccw(self, check_fit):
+        return self.rotate_figure(1, check_fit)
+
+    def drop_figure(self):
+        oldy = self.py
+        self.py = self.ghost_py()
+        return oldy != self.py
+
+    def fits(self, shape, px, py):
+        x = px + shape.left
+        if x < 0 or px + shape.right >= self.bw:
+            return False
+        rows = self.rows
+        bh = self.bh
+        for i, mask in shape.masks:
+            y = py + i
+            if y < 0:
+                return False
+            if y < bh and rows[y] & (mask << x):
+                return False
+        return True
+
+    def figure_fits(self, py=None):
+        if py is None:
+            py = self.py
+        return self.fits(self.shape, self.px, py)
+
+    def ghost_py(self):
+        key = (self.shape, self.px, self.py, self.glass_version)
+        if key != self.ghost_key:
+            self.ghost_key = key
+            self.ghost = self.landing_py(self.shape, self.px, self.py)
+        return self.ghost
+
+    def landing_py(self, shape, px, py):
+        # the lowest cell of each column of the shape rests on the height
+        # of that glass column, unless the shape is already below it
+        heights = self.heights
+        land = -shape.bottom
+        for col, low, high in shape.columns:
+            height = heights[px + col]
+            if py + low < height:
+                return self.scan_landing_py(shape, px, py)
+            if height - low > land:
+                land = height - low
+        return land
+
+    def scan_landing_py(self, shape, px, py):
+        py -= 1
+        while self.fits(shape, px, py):
+            py -= 1
+        return py + 1
+
+    def put_figure(self):
+        self.score += self.figure_score
+        self.lock_py = self.py
+        px = self.px
+        x = px + self.shape.left
+        for i, mask in self.shape.masks:
+            if self.py + i < self.bh:
+                self.rows[self.py + i] |= mask << x
+        for i, j, color in self.shape.cells:
+            if self.py + i < self.bh:
+                self.glass[self.py + i][px + j] = color
+        for col, low, high in self.shape.columns:
+            # cells above the glass are dropped and do not count
+            if self.py + low >= self.bh:
+                continue
+            height = min(self.py + high, self.bh - 1) + 1
+            if height > self.heights[px + col]:
+                self.heights[px + col] = height
+        self.glass_version += 1
+
+    def bonus_line_score(self, line):
+        self.bonus = 50 - (line * 2)
+        self.score += self.bonus
+
+    def chk_glass(self):
+        # only rows touched by the last figure can have become full
+        rows = self.rows
+        clearlines = []
+        bottom = max(self.lock_py, 0)
+        for i in range(min(self.lock_py + 3, self.bh - 1), bottom - 1, -1):
+            if rows[i] == self.full:
+                clearlines.append(i)
+                self.bonus_line_score(i)
+                self.linecount += 1
+        if not clearlines:
+            return
+        self.clearing = clearlines
+        self.emit(CLEAR, clearlines)
+
+    def finish_clear(self):
+        self.compact_glass()
+        self.clearing = []
+
+    def compact_glass(self):
+        rows = self.rows
+        glass = self.glass
+        full = self.full
+        cleared = []
+        top = 0
+        for i in range(self.bh):
+            if rows[i] == full:
+                cleared.append(glass[i])
+            else:
+                rows[top] = rows[i]
+                glass[top] = glass[i]
+                top += 1
+        for row in cleared:
+            row[:] = bytes(self.bw)
+            rows[top] = 0
+            glass[top] = row
+            top += 1
+        self.update_heights()
+        self.glass_version += 1
+
+    def update_heights(self):
+        heights = self.heights
+        for j in range(self.bw):
+            heights[j] = 0
+        seen = 0
+        for i in range(self.bh - 1, -1, -1):
+            new = self.rows[i] & ~seen
+            seen |= new
+            while new:
+                bit = new & -new
+                heights[bit.bit_length() - 1] = i + 1
+                new ^= bit
+
+    def clear_glass(self):
+        for i in range(self.bh):
+            self.rows[i] = 0
+            self.glass[i][:] = bytes(self.bw)
+        for j in range(self.bw):
+            self.heights[j] = 0
+        self.glass_version += 1
+
+    def add_garbage(self, count, hole, color=7):
+        # push the stack up by count rows, full but for the hole column,
+        # as sent by an opponent in a versus game
+        count = min(count, self.bh)
+        if count <= 0 or self.game_over:
+            return
+        overflow = self.push_rows(count, hole, color)
+        if not self.figure_fits():
+            # the falling figure is carried up with the stack
+            self.py += count
+        if overflow or not self.figure_fits():
+            self.game_over = True
+            if self.recorder is not None:
+                self.recorder.finish()
+            self.emit(GAME_OVER)
+
+    def push_rows(self, count, hole, color=7):
+        # the rows of add_garbage() alone, leaving the figure where it
+        # is; returns whether filled rows were pushed out of the glass
+        count = min(count, self.bh)
+        if count <= 0:
+            return False
+        overflow = any(self.rows[self.bh - count:])
+        rows = self.rows
+        glass = self.glass
+        recycled = glass[self.bh - count:]
+        rows[count:] = rows[:self.bh - count]
+        glass[count:] = glass[:self.bh - count]
+        for i, row in enumerate(recycled):
+            rows[i] = self.full & ~(1 << hole)
+            row[:] = bytes([color]) * self.bw
+            row[hole] = 0
+            glass[i] = row
+        self.update_heights()
+        self.glass_version += 1
+        return overflow
+
+
+class KeyRepeat:
+
+    # a held key acts once when pressed, then again after delay seconds
+    # and every rate seconds after that
+    delay = 0.17
+    rate = 0.05
+    repeating = (LEFT, RIGHT)
+
+    def __init__(self):
+        # action -> time of the next repeat, or None if it does not repeat
+        self.held = {}
+        self.pending = []
+
+    def press(self, action, now):
+        if action in self.held:
+            # system autorepeat, the engine does its own
+            return False
+        if action in self.repeating:
+            self.held[action] = now + self.delay
+        else:
+            self.held[action] = None
+        self.pending.append(action)
+        return True
+
+    def release(self, action):
+        self.held.pop(action, None)
+
+    def release_all(self):
+        self.held.clear()
+        self.pending = []
+
+    def poll(self, now, blocked=False):
+        # while blocked, as when the engine is clearing rows, presses are
+        # kept for later and repeats are skipped
+        actions = [] if blocked else self.pending
+        if not blocked:
+            self.pending = []
+        for action, due in self.held.items():
+            if due is not None and due <= now:
+                if not blocked:
+                    actions.append(action)
+                due += self.rate
+                self.held[action] = due if due > now else now + self.rate
+        return actions
+
+    def deadline(self):
+        due = [d for d in self.held.values() if d is not None]
+        return min(due) if due else None
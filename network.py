@@ -0,0 +1,354 @@
+#
+# Copyright (c) 2026 Sugar Labs
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+#  Shared games over the network.  Every player runs their own engine
+#  and sends what changed in it; the other players keep a mirror engine
+#  for each remote board, only to draw it.
+#
+#  A packet is MAGIC, a sequence number as a varint and the events of
+#  one tick, each a code byte followed by its fields:
+#
+#    PIECE    figure << 2 | rotation, px + 8, py + 8
+#    LOCK     the same fields, for the figure being locked
+#    CLEAR    row count, rows cleared by that lock
+#    GARBAGE  count, hole
+#    SCORE    score varint, lines varint
+#    CHECKSUM crc32 of the row bitmasks, 4 bytes
+#    OVER
+#    SNAPSHOT two colors per byte for every cell, score, lines
+#    RESYNC   asks every player for a SNAPSHOT
+#
+#  A gap in the sequence numbers or a wrong checksum asks for a
+#  snapshot.  Transports only move whole packets between players, so
+#  the same session runs over the text channel of a shared Sugar
+#  activity or a plain UDP socket.
+
+import base64
+import logging
+import socket
+import zlib
+
+import engine
+import savegame
+from replay import write_varint, read_varint
+
+MAGIC = 0xb9
+(PIECE, LOCK, CLEAR, GARBAGE, SCORE, CHECKSUM, OVER, SNAPSHOT,
+ RESYNC) = range(9)
+# locks between checksums
+CHECKSUM_EVERY = 8
+
+
+def checksum(eng):
+    return zlib.crc32(b''.join(row.to_bytes(2, 'little')
+                               for row in eng.rows))
+
+
+def encode_snapshot(eng, out):
+    savegame.pack_glass(eng, out)
+    write_varint(out, eng.score)
+    write_varint(out, eng.linecount)
+
+
+def decode_snapshot(eng, data, pos):
+    pos = savegame.unpack_glass(eng, data, pos)
+    eng.score, pos = read_varint(data, pos)
+    eng.linecount, pos = read_varint(data, pos)
+    return pos
+
+
+class Transport:
+
+    # sends packets to every other player; incoming packets are passed
+    # to receiver(peer, data), peer being any hashable player id
+
+    def __init__(self):
+        self.receiver = None
+
+    def send(self, data):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SocketTransport(Transport):
+
+    # UDP between known addresses, for trying shared games without the
+    # Sugar collaboration service; read() is called when fileno() is
+    # readable
+
+    def __init__(self, port, peers, host='0.0.0.0'):
+        Transport.__init__(self)
+        self.peers = list(peers)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.socket.setblocking(False)
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def send(self, data):
+        for peer in self.peers:
+            try:
+                self.socket.sendto(data, peer)
+            except OSError as e:
+                logging.error('cannot send to %s: %s', peer, e)
+
+    def read(self):
+        while True:
+            try:
+                data, peer = self.socket.recvfrom(4096)
+            except (BlockingIOError, InterruptedError):
+                return True
+            if self.receiver is not None:
+                self.receiver(peer, data)
+
+    def close(self):
+        self.socket.close()
+
+
+class TextChannelTransport(Transport):
+
+    # packets as messages on the Telepathy text channel of a shared Sugar
+    # activity, base64 encoded after PREFIX so that other messages on the
+    # channel are ignored; players are told apart by their handles
+
+    TEXT = 'org.freedesktop.Telepathy.Channel.Type.Text'
+    GROUP = 'org.freedesktop.Telepathy.Channel.Interface.Group'
+    MESSAGE_TYPE_NORMAL = 0
+    PREFIX = 'blockparty:'
+
+    def __init__(self, channel):
+        Transport.__init__(self)
+        self.channel = channel
+        self.self_handle = channel[self.GROUP].GetSelfHandle()
+        self.match = channel[self.TEXT].connect_to_signal(
+            'Received', self.received_cb)
+
+    def send(self, data):
+        text = self.PREFIX + base64.b64encode(data).decode('ascii')
+        self.channel[self.TEXT].Send(self.MESSAGE_TYPE_NORMAL, text)
+
+    def received_cb(self, identity, timestamp, sender, message_type, flags,
+                    text):
+        self.channel[self.TEXT].AcknowledgePendingMessages([identity])
+        if sender == self.self_handle or self.receiver is None or \
+           not text.startswith(self.PREFIX):
+            return
+        try:
+            data = base64.b64decode(text[len(self.PREFIX):])
+        except ValueError:
+            return
+        self.receiver(int(sender), data)
+
+    def close(self):
+        self.match.remove()
+
+
+class Peer:
+
+    def __init__(self, bw, bh):
+        self.engine = engine.Engine(bw, bh)
+        self.engine.clear_glass()
+        self.expected = None
+        self.desynced = False
+
+
+class Session:
+
+    def __init__(self, transport, eng, listener=None):
+        self.transport = transport
+        transport.receiver = self.receive
+        self.engine = eng
+        # called as listener(peer, event, arg) with LOCK, CLEAR and the
+        # rows, or GAME_OVER from a remote board, and with None after
+        # every packet
+        self.listener = listener
+        self.peers = {}
+        self.seq = 0
+        self.events = bytearray()
+        self.piece = None
+        self.score = None
+        self.locks = 0
+        self.want_snapshot = False
+        self.sent = 0
+
+    def emit(self, peer, event, arg=None):
+        if self.listener is not None:
+            self.listener(peer, event, arg)
+
+    # the local board
+
+    def piece_state(self):
+        eng = self.engine
+        return (eng.figure << 2 | eng.rotation, eng.px + 8, eng.py + 8)
+
+    def lock(self):
+        # called on LOCK, while the engine still holds the locked figure
+        self.events.append(LOCK)
+        self.events.extend(self.piece_state())
+        self.locks += 1
+
+    def clear(self, lines):
+        self.events.extend((CLEAR, len(lines)))
+        self.events.extend(sorted(lines))
+
+    def garbage(self, count, hole):
+        self.events.extend((GARBAGE, count, hole))
+
+    def game_over(self):
+        self.events.append(OVER)
+
+    def flush(self):
+        # one packet with everything that happened since the last one
+        eng = self.engine
+        if not eng.game_over:
+            piece = self.piece_state()
+            if piece != self.piece:
+                self.piece = piece
+                self.events.append(PIECE)
+                self.events.extend(piece)
+        score = (eng.score, eng.linecount)
+        if score != self.score:
+            self.score = score
+            self.events.append(SCORE)
+            write_varint(self.events, eng.score)
+            write_varint(self.events, eng.linecount)
+        # full rows stay in the glass for a tick, the mirrors drop them
+        # at once, so both only agree when nothing is being cleared
+        if self.want_snapshot and not eng.clearing:
+            self.want_snapshot = False
+            self.events.append(SNAPSHOT)
+            encode_snapshot(eng, self.events)
+        if self.locks >= CHECKSUM_EVERY and not eng.clearing:
+            self.locks = 0
+            self.events.append(CHECKSUM)
+            self.events.extend(checksum(eng).to_bytes(4, 'little'))
+        if not self.events:
+            return
+        packet = bytearray((MAGIC,))
+        write_varint(packet, self.seq)
+        packet.extend(self.events)
+        self.seq += 1
+        self.events = bytearray()
+        self.transport.send(bytes(packet))
+        self.sent += len(packet)
+
+    def close(self):
+        self.transport.close()
+
+    # remote boards
+
+    def receive(self, key, data):
+        if not data or data[0] != MAGIC:
+            return
+        peer = self.peers.get(key)
+        if peer is None:
+            peer = self.peers[key] = Peer(self.engine.bw, self.engine.bh)
+            # joined after the game started, ask for the glass so far
+            self.resync(peer)
+        try:
+            seq, pos = read_varint(data, 1)
+            if seq == 0 and peer.expected:
+                # the other player started a new game
+                peer.engine.clear_glass()
+                peer.engine.game_over = False
+                peer.expected = None
+            if peer.expected is not None:
+                if seq < peer.expected:
+                    return
+                if seq > peer.expected:
+                    logging.warning('lost %d packets from %s',
+                                    seq - peer.expected, key)
+                    self.resync(peer)
+            peer.expected = seq + 1
+            while pos < len(data):
+                pos = self.apply(key, peer, data, pos)
+        except (IndexError, ValueError) as e:
+            logging.error('bad packet from %s: %s', key, e)
+            self.resync(peer)
+        self.emit(key, None)
+
+    def resync(self, peer):
+        if not peer.desynced:
+            peer.desynced = True
+            self.events.append(RESYNC)
+
+    def apply(self, key, peer, data, pos):
+        eng = peer.engine
+        code = data[pos]
+        pos += 1
+        if code == PIECE:
+            self.place(eng, data[pos:pos + 3])
+            return pos + 3
+        if code == LOCK:
+            self.place(eng, data[pos:pos + 3])
+            eng.put_figure()
+            self.emit(key, engine.LOCK)
+            return pos + 3
+        if code == CLEAR:
+            count = data[pos]
+            rows = list(data[pos + 1:pos + 1 + count])
+            full = [i for i in range(eng.bh) if eng.rows[i] == eng.full]
+            if full != rows:
+                self.resync(peer)
+            eng.compact_glass()
+            self.emit(key, engine.CLEAR, rows)
+            return pos + 1 + count
+        if code == GARBAGE:
+            # only the owner knows whether the board topped out, which
+            # arrives as OVER
+            eng.push_rows(data[pos], data[pos + 1])
+            return pos + 2
+        if code == SCORE:
+            eng.score, pos = read_varint(data, pos)
+            eng.linecount, pos = read_varint(data, pos)
+            return pos
+        if code == CHECKSUM:
+            if checksum(eng) != int.from_bytes(data[pos:pos + 4], 'little'):
+                logging.warning('board of %s out of step', key)
+                self.resync(peer)
+            return pos + 4
+        if code == OVER:
+            eng.game_over = True
+            self.emit(key, engine.GAME_OVER)
+            return pos
+        if code == SNAPSHOT:
+            pos = decode_snapshot(eng, data, pos)
+            peer.desynced = False
+            return pos
+        if code == RESYNC:
+            self.want_snapshot = True
+            return pos
+        raise ValueError('unknown event %d' % code)
+
+    def place(self, eng, fields):
+        if len(fields) < 3:
+            raise IndexError(len(fields))
+        figure, rotation = fields[0] >> 2, fields[0] & 3
+        eng.figure, eng.rotation = figure, rotation
+        eng.shape = engine.ORIENTATIONS[figure][rotation]
+        eng.px = fields[1] - 8
+        eng.py = fields[2] - 8
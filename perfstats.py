@@ -0,0 +1,124 @@
+#
+# Copyright (c) 2026 Sugar Labs
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+#  Low overhead timing of the game loop and renderer hot paths.
+
+import collections
+import functools
+import json
+import math
+import time
+
+# buckets per doubling of the value, about 19% resolution
+RESOLUTION = 4
+
+
+class Histogram:
+
+    def __init__(self):
+        self.buckets = collections.Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if value > 0:
+            m, e = math.frexp(value)
+            self.buckets[e * RESOLUTION + int((m - 0.5) * 2 * RESOLUTION)] += 1
+        else:
+            self.buckets[None] += 1
+
+    def percentile(self, p):
+        # upper bound of the bucket holding the p-th percentile
+        if self.count == 0:
+            return 0.0
+        rank = self.count * p / 100.0
+        seen = self.buckets[None]
+        if seen >= rank:
+            return 0.0
+        for index in sorted(i for i in self.buckets if i is not None):
+            seen += self.buckets[index]
+            if seen >= rank:
+                e, step = divmod(index, RESOLUTION)
+                return min(self.max, math.ldexp(
+                    0.5 + (step + 1) / (2.0 * RESOLUTION), e))
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class PerfStats:
+
+    def __init__(self):
+        self.histograms = collections.defaultdict(Histogram)
+        self.frame_times = collections.deque(maxlen=60)
+
+    def add(self, name, value):
+        self.histograms[name].add(value)
+
+    def wrap(self, obj, name, key=None):
+        # replace a bound method with one that records its duration
+        method = getattr(obj, name)
+        histogram = self.histograms[key or name]
+        clock = time.perf_counter
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                histogram.add(clock() - start)
+        setattr(obj, name, timed)
+
+    def frame(self):
+        self.frame_times.append(time.perf_counter())
+
+    def fps(self):
+        if len(self.frame_times) < 2:
+            return 0.0
+        span = self.frame_times[-1] - self.frame_times[0]
+        if span <= 0:
+            return 0.0
+        return (len(self.frame_times) - 1) / span
+
+    def summary(self):
+        return dict((name, histogram.summary())
+                    for name, histogram in sorted(self.histograms.items()))
+
+    def dump(self, path):
+        with open(path, 'w') as fp:
+            json.dump({'fps': self.fps(), 'stats': self.summary()},
+                      fp, indent=1, sort_keys=True)
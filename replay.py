@@ -0,0 +1,188 @@
+#
+# Copyright (c) 2026 Sugar Labs
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+#  Games recorded as a seed and a tick-indexed action log, replayed at
+#  full speed without a display or in real time by BlockParty.
+#
+#  The log is a sequence of (ticks since the previous entry, code)
+#  pairs, the tick count as an unsigned LEB128 varint and the code as a
+#  single byte, ending with END when the game is over.
+
+import sys
+import time
+
+import engine
+
+MAGIC = b'BPR'
+VERSION = 1
+END = 255
+
+
+def write_varint(out, value):
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class Recorder:
+
+    def __init__(self, eng):
+        self.seed = eng.seed
+        self.level = eng.level
+        self.bw = eng.bw
+        self.bh = eng.bh
+        self.log = bytearray()
+        self.ticks = 0
+        self.last = 0
+        self.finished = False
+        eng.recorder = self
+
+    def tick(self):
+        self.ticks += 1
+
+    def action(self, code):
+        write_varint(self.log, self.ticks - self.last)
+        self.log.append(code)
+        self.last = self.ticks
+
+    def finish(self):
+        self.action(END)
+        self.finished = True
+
+    def encode(self):
+        out = bytearray(MAGIC)
+        out.append(VERSION)
+        for value in (self.seed, self.level, self.bw, self.bh):
+            write_varint(out, value)
+        return bytes(out + self.log)
+
+
+class Recording:
+
+    def __init__(self, seed, level, bw, bh, events):
+        self.seed = seed
+        self.level = level
+        self.bw = bw
+        self.bh = bh
+        # [(ticks since the previous event, code), ...]
+        self.events = events
+
+    @classmethod
+    def decode(cls, data):
+        if data[:len(MAGIC)] != MAGIC or len(data) <= len(MAGIC) or \
+           data[len(MAGIC)] != VERSION:
+            raise ValueError('not a Block Party recording')
+        pos = len(MAGIC) + 1
+        try:
+            header = []
+            for i in range(4):
+                value, pos = read_varint(data, pos)
+                header.append(value)
+            events = []
+            while pos < len(data):
+                delta, pos = read_varint(data, pos)
+                events.append((delta, data[pos]))
+                pos += 1
+        except IndexError:
+            raise ValueError('truncated recording')
+        return cls(*header, events=events)
+
+    def new_engine(self, listener=None):
+        # the same state BlockParty is in when play starts
+        eng = engine.Engine(self.bw, self.bh, seed=self.seed,
+                            listener=listener)
+        eng.set_level(self.level)
+        return eng
+
+
+def apply(eng, code):
+    if code == engine.SOFT_DROP:
+        eng.speed_up()
+    elif code == engine.SOFT_DROP_OFF:
+        eng.slow_down()
+    else:
+        eng.step(code)
+
+
+def run(recording):
+    eng = recording.new_engine()
+    for delta, code in recording.events:
+        for i in range(delta):
+            eng.tick()
+        if code == END:
+            break
+        apply(eng, code)
+    return eng
+
+
+class Player:
+
+    # feeds a recording to an engine ticked by someone else
+
+    def __init__(self, recording):
+        self.ticks = 0
+        self.due = []
+        at = 0
+        for delta, code in recording.events:
+            at += delta
+            self.due.append((at, code))
+        self.due.reverse()
+
+    def tick(self):
+        self.ticks += 1
+
+    def actions(self):
+        actions = []
+        while self.due and self.due[-1][0] <= self.ticks:
+            code = self.due.pop()[1]
+            if code != END:
+                actions.append(code)
+        return actions
+
+
+def main():
+    for path in sys.argv[1:]:
+        with open(path, 'rb') as fp:
+            recording = Recording.decode(fp.read())
+        start = time.perf_counter()
+        eng = run(recording)
+        print('%s: seed %d score %d lines %d level %d in %.3f s' % (
+            path, recording.seed, eng.score, eng.linecount, eng.level,
+            time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
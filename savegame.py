@@ -0,0 +1,131 @@
+#
+# Copyright (c) 2026 Sugar Labs
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+#  A game in progress, saved to the Journal and resumed from it.
+#
+#  MAGIC, VERSION, then as varints the glass size, the seed and the
+#  number of figures dealt from it, score, lines, level, bonus and
+#  figure score, a flags byte, the current and next figure as figure
+#  << 2 | rotation, the position offset by POSITION_BIAS, the rows
+#  being cleared, and last the glass at two cells per byte.  An 11x20
+#  game takes about 130 bytes.
+#
+#  The random generator is restored by reseeding it and dealing the
+#  same number of figures again, rather than storing its 2.5 KB state.
+
+import engine
+from replay import write_varint, read_varint
+
+MAGIC = b'BPG'
+VERSION = 1
+POSITION_BIAS = 8
+SOFT_DROP_BLOCKED = 1
+
+
+def pack_glass(eng, out):
+    cells = b''.join(bytes(row) for row in eng.glass)
+    if len(cells) % 2:
+        cells += b'\0'
+    out.extend(cells[i] << 4 | cells[i + 1]
+               for i in range(0, len(cells), 2))
+
+
+def unpack_glass(eng, data, pos):
+    size = eng.bw * eng.bh
+    end = pos + (size + 1) // 2
+    if len(data) < end:
+        raise IndexError(end)
+    cells = bytearray()
+    for byte in data[pos:end]:
+        cells.append(byte >> 4)
+        cells.append(byte & 15)
+    for i in range(eng.bh):
+        row = cells[i * eng.bw:(i + 1) * eng.bw]
+        eng.glass[i][:] = row
+        eng.rows[i] = sum(1 << j for j, c in enumerate(row) if c)
+    eng.update_heights()
+    eng.glass_version += 1
+    return end
+
+
+def encode(eng):
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    for value in (eng.bw, eng.bh, eng.seed, eng.dealt, eng.score,
+                  eng.linecount, eng.level, eng.bonus, eng.figure_score):
+        write_varint(out, value)
+    out.append(0 if eng.can_speed_up else SOFT_DROP_BLOCKED)
+    out.append(eng.figure << 2 | eng.rotation)
+    out.append(eng.next_figure << 2 | eng.next_rotation)
+    out.append(eng.px + POSITION_BIAS)
+    out.append(eng.py + POSITION_BIAS)
+    out.append(len(eng.clearing))
+    out.extend(eng.clearing)
+    pack_glass(eng, out)
+    return bytes(out)
+
+
+def decode(eng, data):
+    # restores a game saved by encode() into eng; raises ValueError if
+    # data is not a saved game for a glass of this size
+    if data[:len(MAGIC)] != MAGIC or len(data) <= len(MAGIC) or \
+       data[len(MAGIC)] != VERSION:
+        raise ValueError('not a Block Party game')
+    pos = len(MAGIC) + 1
+    try:
+        values = []
+        for i in range(9):
+            value, pos = read_varint(data, pos)
+            values.append(value)
+        (bw, bh, seed, dealt, score, lines, level, bonus,
+         figure_score) = values
+        if (bw, bh) != (eng.bw, eng.bh):
+            raise ValueError('saved game is %dx%d' % (bw, bh))
+        flags, current, following, px, py, count = data[pos:pos + 6]
+        pos += 6
+        clearing = list(data[pos:pos + count])
+        pos += count
+        figure, rotation = current >> 2, current & 3
+        next_figure, next_rotation = following >> 2, following & 3
+        if max(figure, next_figure) >= len(engine.FIGURES):
+            raise ValueError('bad figure')
+
+        eng.reset(level, seed)
+        eng.skip_figures(dealt - eng.dealt)
+        pos = unpack_glass(eng, data, pos)
+    except (IndexError, ValueError) as e:
+        raise ValueError('damaged saved game: %s' % e)
+    eng.score = score
+    eng.linecount = lines
+    eng.bonus = bonus
+    eng.figure_score = figure_score
+    eng.can_speed_up = not flags & SOFT_DROP_BLOCKED
+    eng.set_time_step()
+    eng.figure, eng.rotation = figure, rotation
+    eng.next_figure, eng.next_rotation = next_figure, next_rotation
+    eng.shape = engine.ORIENTATIONS[figure][rotation]
+    eng.next_shape = engine.ORIENTATIONS[next_figure][next_rotation]
+    eng.px = px - POSITION_BIAS
+    eng.py = py - POSITION_BIAS
+    eng.clearing = clearing
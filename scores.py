@@ -0,0 +1,79 @@
+#
+# Copyright (c) 2026 Sugar Labs
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+#  High scores, loaded once and kept in memory, written atomically
+#  when a game ends.
+
+import json
+import logging
+import os
+import time
+
+
+class ScoreStore:
+
+    version = 1
+    size = 10
+
+    def __init__(self, path):
+        self.path = path
+        self.highscore = 0
+        # best games first, each [score, level, lines, duration, time]
+        self.leaderboard = []
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, int):
+            # a bare high score, as written by older versions
+            self.highscore = data
+            return
+        if not isinstance(data, dict) or data.get('version') != self.version:
+            return
+        self.leaderboard = [list(entry) for entry in data.get('scores', [])]
+        best = [entry[0] for entry in self.leaderboard]
+        self.highscore = max([data.get('highscore', 0)] + best)
+
+    def add(self, score, level, lines, duration):
+        self.highscore = max(self.highscore, score)
+        entry = [score, level, lines, int(duration), int(time.time())]
+        self.leaderboard.append(entry)
+        self.leaderboard.sort(key=lambda entry: -entry[0])
+        del self.leaderboard[self.size:]
+
+    def save(self):
+        data = {'version': self.version, 'highscore': self.highscore,
+                'scores': self.leaderboard}
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'w') as fp:
+                json.dump(data, fp, separators=(',', ':'))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logging.error('cannot save scores: %s', e)
+        return False
@@ -0,0 +1,215 @@
+#
+# Copyright (c) 2026 Sugar Labs
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+#  Tunes the autoplayer weights by self-play, using the cross-entropy
+#  method: each generation samples candidate weight vectors around a
+#  mean, plays the same set of seeded headless games with every
+#  candidate in a process pool, and moves the mean towards the best
+#  candidates.
+#
+#    python3 selfplay.py --generations 20 --checkpoint tune.json
+#
+#  The checkpoint is written after every generation and a run given an
+#  existing checkpoint continues from it.
+
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+
+import autoplay
+import engine
+
+
+def play(weights, seed, max_pieces=500, level=5, lookahead=False):
+    # one game at full speed, every figure dropped straight to its place
+    eng = engine.Engine(seed=seed)
+    eng.set_level(level)
+    player = autoplay.AutoPlayer(eng, lookahead, weights)
+    pieces = 0
+    while not eng.game_over and pieces < max_pieces:
+        for action in player.plan():
+            eng.step(action)
+        # the figure has been dropped, the next tick locks it
+        eng.tick()
+        if eng.clearing:
+            eng.tick()
+        pieces += 1
+    return eng.score, eng.linecount, pieces
+
+
+def play_task(task):
+    index, weights, seed, max_pieces, lookahead = task
+    return index, play(weights, seed, max_pieces, lookahead=lookahead)
+
+
+def game_seeds(seed, generation, games):
+    # every candidate of a generation plays the same games
+    rng = autoplay.numpy.random.default_rng([seed, generation])
+    return [int(s) for s in rng.integers(1 << 32, size=games)]
+
+
+def distribution(values):
+    values = autoplay.numpy.array(values)
+    return {
+        'mean': float(values.mean()),
+        'min': int(values.min()),
+        'p10': float(autoplay.numpy.percentile(values, 10)),
+        'p50': float(autoplay.numpy.percentile(values, 50)),
+        'p90': float(autoplay.numpy.percentile(values, 90)),
+        'max': int(values.max()),
+    }
+
+
+def format_distribution(d):
+    return 'mean %.1f p10 %.1f p50 %.1f p90 %.1f' % (
+        d['mean'], d['p10'], d['p50'], d['p90'])
+
+
+class CrossEntropy:
+
+    def __init__(self, seed=0, population=16, elite=4, sigma=0.5,
+                 noise=0.05):
+        self.seed = seed
+        self.population = population
+        self.elite = elite
+        self.noise = noise
+        self.generation = 0
+        self.mean = list(autoplay.WEIGHTS)
+        self.sigma = [sigma] * len(self.mean)
+        self.best = None
+        self.history = []
+
+    def candidates(self):
+        numpy = autoplay.numpy
+        rng = numpy.random.default_rng([self.seed, self.generation, 1])
+        samples = rng.normal(self.mean, self.sigma,
+                             (self.population, len(self.mean)))
+        # only the direction of a weight vector matters
+        samples /= numpy.linalg.norm(samples, axis=1)[:, None]
+        return samples.tolist()
+
+    def update(self, candidates, results):
+        numpy = autoplay.numpy
+        fitness = [numpy.mean([lines for score, lines, pieces in games])
+                   for games in results]
+        order = numpy.argsort(fitness)[::-1]
+        elite = numpy.array([candidates[i] for i in order[:self.elite]])
+        self.mean = elite.mean(axis=0).tolist()
+        self.sigma = (elite.std(axis=0) + self.noise).tolist()
+        report = []
+        for weights, games in zip(candidates, results):
+            report.append({
+                'weights': weights,
+                'lines': distribution([g[1] for g in games]),
+                'score': distribution([g[0] for g in games]),
+            })
+        best = report[order[0]]
+        if self.best is None or \
+           best['lines']['mean'] > self.best['lines']['mean']:
+            self.best = best
+        self.history.append({'generation': self.generation,
+                             'mean': self.mean, 'candidates': report})
+        self.generation += 1
+        return best
+
+    def save(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as fp:
+            json.dump(self.__dict__, fp, indent=1)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        optimiser = cls()
+        with open(path) as fp:
+            optimiser.__dict__.update(json.load(fp))
+        return optimiser
+
+
+def run_generation(pool, jobs, optimiser, games, max_pieces, lookahead):
+    candidates = optimiser.candidates()
+    seeds = game_seeds(optimiser.seed, optimiser.generation, games)
+    tasks = [(i, weights, seed, max_pieces, lookahead)
+             for i, weights in enumerate(candidates) for seed in seeds]
+    results = [[] for weights in candidates]
+    chunksize = max(1, len(tasks) // (jobs * 4))
+    for i, result in pool.map(play_task, tasks, chunksize=chunksize):
+        results[i].append(result)
+    return optimiser.update(candidates, results)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Tune the autoplayer weights by self-play')
+    parser.add_argument('--generations', type=int, default=10)
+    parser.add_argument('--population', type=int, default=16)
+    parser.add_argument('--elite', type=int, default=4)
+    parser.add_argument('--games', type=int, default=8,
+                        help='games per candidate and generation')
+    parser.add_argument('--max-pieces', type=int, default=500)
+    parser.add_argument('--lookahead', action='store_true',
+                        help='also place the next figure when searching')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count())
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='report every candidate, not just the best')
+    parser.add_argument('--checkpoint',
+                        help='save progress here and resume from it')
+    args = parser.parse_args()
+
+    if not autoplay.AVAILABLE:
+        sys.exit('selfplay needs NumPy')
+
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        optimiser = CrossEntropy.load(args.checkpoint)
+        print('resuming at generation %d' % optimiser.generation)
+    else:
+        optimiser = CrossEntropy(args.seed, args.population, args.elite)
+
+    with concurrent.futures.ProcessPoolExecutor(args.jobs) as pool:
+        while optimiser.generation < args.generations:
+            best = run_generation(pool, args.jobs, optimiser, args.games,
+                                  args.max_pieces, args.lookahead)
+            if args.verbose:
+                for candidate in optimiser.history[-1]['candidates']:
+                    print('  %s  lines %s  score %s' % (
+                        ' '.join('%.3f' % w for w in candidate['weights']),
+                        format_distribution(candidate['lines']),
+                        format_distribution(candidate['score'])))
+            print('generation %d: lines mean %.1f p10 %.1f max %d  %s' % (
+                optimiser.generation - 1, best['lines']['mean'],
+                best['lines']['p10'], best['lines']['max'],
+                ' '.join('%.3f' % w for w in best['weights'])))
+            if args.checkpoint:
+                optimiser.save(args.checkpoint)
+
+    if optimiser.best is not None:
+        print('best: %s' % (tuple(round(w, 6)
+                                  for w in optimiser.best['weights']),))
+
+
+if __name__ == "__main__":
+    main()
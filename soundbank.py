@@ -0,0 +1,204 @@
+#
+# Copyright (c) 2026 Sugar Labs
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+#  Sound effects decoded once into memory and played through a small
+#  pool of mixed voices, so that effects can overlap.  The pipeline is
+#  paused whenever every voice is idle, since a live mixer keeps the
+#  audio sink busy even when it only mixes silence.
+
+import logging
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import GLib
+from gi.repository import Gst
+
+
+Gst.init(None)
+
+RATE = 44100
+CHANNELS = 2
+FRAME_BYTES = 2 * CHANNELS
+CAPS = 'audio/x-raw,format=S16LE,layout=interleaved,rate=%d,channels=%d' % (
+    RATE, CHANNELS)
+# sounds are pushed in small buffers so a stolen voice stops quickly
+CHUNK_BYTES = RATE // 20 * FRAME_BYTES
+
+
+class SoundBankError(Exception):
+    pass
+
+
+def decode(path, timeout=5):
+    pipeline = Gst.parse_launch(
+        'uridecodebin uri=%s ! audioconvert ! audioresample ! '
+        'capsfilter caps="%s" ! appsink name=sink sync=false' % (
+            Gst.filename_to_uri(path), CAPS))
+    sink = pipeline.get_by_name('sink')
+    pipeline.set_state(Gst.State.PLAYING)
+    message = pipeline.get_bus().timed_pop_filtered(
+        timeout * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    data = []
+    if message is not None and message.type == Gst.MessageType.EOS:
+        while True:
+            sample = sink.emit('try-pull-sample', 0)
+            if sample is None:
+                break
+            buf = sample.get_buffer()
+            data.append(buf.extract_dup(0, buf.get_size()))
+    pipeline.set_state(Gst.State.NULL)
+    if message is None:
+        raise SoundBankError('timed out decoding %s' % path)
+    if message.type == Gst.MessageType.ERROR:
+        raise SoundBankError('%s: %s' % (path, message.parse_error()[0]))
+    data = b''.join(data)
+    return [data[i:i + CHUNK_BYTES] for i in range(0, len(data), CHUNK_BYTES)]
+
+
+class Voice:
+
+    def __init__(self, src):
+        self.src = src
+        self.started = 0
+        self.busy_until = 0
+        self.priority = 0
+
+
+class SoundBank:
+
+    latency = 20 * Gst.MSECOND
+
+    def __init__(self, paths, voices=4):
+        pipeline = Gst.Pipeline()
+        mixer = Gst.ElementFactory.make('audiomixer', None)
+        convert = Gst.ElementFactory.make('audioconvert', None)
+        sink = Gst.ElementFactory.make('autoaudiosink', None)
+        if mixer is None or convert is None or sink is None:
+            raise SoundBankError('audiomixer or audio sink not available')
+        for element in (mixer, convert, sink):
+            pipeline.add(element)
+        mixer.link(convert)
+        convert.link(sink)
+
+        caps = Gst.Caps.from_string(CAPS)
+        self._voices = []
+        for i in range(voices):
+            src = Gst.ElementFactory.make('appsrc', None)
+            if src is None:
+                raise SoundBankError('appsrc not available')
+            src.set_property('caps', caps)
+            src.set_property('format', Gst.Format.TIME)
+            src.set_property('is-live', True)
+            pipeline.add(src)
+            src.link(mixer)
+            self._voices.append(Voice(src))
+
+        self.samples = {}
+        for path in paths:
+            try:
+                self.samples[path] = decode(path)
+            except SoundBankError as e:
+                logging.error('%s', e)
+
+        bus = pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect('message::error', self._on_message_error)
+
+        self._pipeline = pipeline
+        self._playing = False
+        self._pause_id = None
+        pipeline.set_state(Gst.State.PAUSED)
+
+    def _on_message_error(self, bus, message):
+        err, debug = message.parse_error()
+        logging.error('%s %s', err, debug)
+
+    def _running_time(self):
+        clock = self._pipeline.get_clock()
+        if clock is None:
+            return 0
+        return clock.get_time() - self._pipeline.get_base_time()
+
+    def _pick_voice(self, now, priority):
+        # a free voice if there is one, otherwise steal the oldest of the
+        # lowest priority voices, unless they all outrank the new sound
+        for voice in self._voices:
+            if voice.busy_until <= now:
+                return voice
+        voice = min(self._voices,
+                    key=lambda voice: (voice.priority, voice.started))
+        if voice.priority > priority:
+            return None
+        voice.src.send_event(Gst.Event.new_flush_start())
+        voice.src.send_event(Gst.Event.new_flush_stop(False))
+        return voice
+
+    def play(self, name, priority=0):
+        chunks = self.samples.get(name)
+        if not chunks or self._pipeline is None:
+            return
+        if not self._playing:
+            self._pipeline.set_state(Gst.State.PLAYING)
+            self._playing = True
+        now = self._running_time()
+        voice = self._pick_voice(now, priority)
+        if voice is None:
+            return
+        pts = now + self.latency
+        for chunk in chunks:
+            buf = Gst.Buffer.new_wrapped(chunk)
+            buf.pts = pts
+            buf.duration = len(chunk) // FRAME_BYTES * Gst.SECOND // RATE
+            pts += buf.duration
+            voice.src.emit('push-buffer', buf)
+        voice.started = now
+        voice.busy_until = pts
+        voice.priority = priority
+        self._schedule_pause(now)
+
+    def _schedule_pause(self, now):
+        # once the last voice has been heard to the end
+        if self._pause_id is not None:
+            GLib.source_remove(self._pause_id)
+        idle = max(voice.busy_until for voice in self._voices) + self.latency
+        self._pause_id = GLib.timeout_add(
+            max(0, idle - now) // Gst.MSECOND + 1, self._pause_cb)
+
+    def _pause_cb(self):
+        self._pause_id = None
+        now = self._running_time()
+        if any(voice.busy_until + self.latency > now
+               for voice in self._voices):
+            self._schedule_pause(now)
+            return False
+        self._pipeline.set_state(Gst.State.PAUSED)
+        self._playing = False
+        return False
+
+    def close(self):
+        if self._pause_id is not None:
+            GLib.source_remove(self._pause_id)
+            self._pause_id = None
+        if self._pipeline is not None:
+            self._pipeline.set_state(Gst.State.NULL)
+            self._pipeline = None
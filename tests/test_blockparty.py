@@ -0,0 +1,72 @@
+import unittest
+
+import bench
+
+try:
+    import cairo
+    import BlockParty
+except (ImportError, ValueError):
+    BlockParty = None
+
+
+@unittest.skipIf(BlockParty is None, 'needs GTK and cairo')
+class BlockPartyTest(unittest.TestCase):
+
+    # the whole game on an offscreen area, as bench.py renders it
+
+    def setUp(self):
+        area = bench.OffscreenArea(800, 600)
+        self.game = BlockParty.BlockParty(area, area)
+        self.game.sound = False
+
+    def draw(self):
+        surface = cairo.ImageSurface(cairo.FORMAT_RGB24, 800, 600)
+        self.game.update_picture(cairo.Context(surface))
+
+    def test_level_screen(self):
+        self.assertEqual(self.game.game_mode, self.game.SELECT_LEVEL)
+        self.draw()
+
+    def test_play(self):
+        game = self.game
+        game.key_action('Return')
+        self.assertEqual(game.game_mode, game.PLAY)
+        self.assertIsNotNone(game.recorder)
+        while game.game_mode == game.PLAY:
+            game.tick()
+            self.draw()
+        self.assertEqual(game.game_mode, game.GAME_OVER)
+
+    def test_hint(self):
+        game = self.game
+        game.key_action('Return')
+        game.show_hint = True
+        game.set_hint((0, 0))
+        self.assertIsNotNone(game.hint)
+        self.draw()
+
+    def test_practice_undo(self):
+        game = self.game
+        game.key_action('t')
+        self.assertIsNotNone(game.history)
+        while game.game_mode == game.PLAY:
+            game.tick()
+        dealt = game.history.dealt
+        game.key_action('z')
+        self.assertEqual(game.game_mode, game.PLAY)
+        self.assertEqual(game.engine.dealt, dealt)
+        self.draw()
+
+    def test_save_and_resume(self):
+        game = self.game
+        game.key_action('Return')
+        for i in range(30):
+            game.tick()
+        data = game.save_game()
+        score = game.engine.score
+        game.resume_game(data)
+        self.assertEqual(game.game_mode, game.PAUSED)
+        self.assertEqual(game.engine.score, score)
+        self.draw()
+        game.key_action(game.left_key[0])
+        self.assertEqual(game.game_mode, game.PLAY)
@@ -0,0 +1,53 @@
+import unittest
+
+import engine
+
+
+class KeyRepeatTest(unittest.TestCase):
+
+    def setUp(self):
+        self.keys = engine.KeyRepeat()
+
+    def test_repeat(self):
+        self.keys.press(engine.LEFT, 0)
+        self.assertEqual(self.keys.poll(0), [engine.LEFT])
+        self.assertEqual(self.keys.poll(0.1), [])
+        self.assertEqual(self.keys.poll(0.2), [engine.LEFT])
+        self.keys.release(engine.LEFT)
+        self.assertEqual(self.keys.poll(1), [])
+
+    def test_blocked(self):
+        # presses wait for the engine, repeats do not pile up meanwhile
+        self.keys.press(engine.ROTATE, 0)
+        self.keys.press(engine.LEFT, 0)
+        self.assertEqual(self.keys.poll(0.5, True), [])
+        self.assertEqual(self.keys.poll(0.5),
+                         [engine.ROTATE, engine.LEFT])
+        self.assertEqual(self.keys.poll(0.55), [engine.LEFT])
+
+    def test_press_while_clearing(self):
+        eng = engine.Engine(seed=3)
+        # a full bottom row but for the gap under a lying I
+        eng.figure, eng.rotation = 3, 0
+        eng.shape = engine.ORIENTATIONS[3][0]
+        for j in range(eng.bw):
+            if not eng.px <= j < eng.px + 4:
+                eng.glass[0][j] = 1
+                eng.rows[0] |= 1 << j
+        eng.update_heights()
+        eng.step(engine.DROP)
+        eng.tick()
+        self.assertEqual(eng.clearing, [0])
+        self.keys.press(engine.LEFT, 0)
+        for action in self.keys.poll(0, bool(eng.clearing)):
+            eng.step(action)
+        px = eng.px
+        eng.tick()
+        self.assertFalse(eng.clearing)
+        for action in self.keys.poll(0, bool(eng.clearing)):
+            eng.step(action)
+        self.assertEqual(eng.px, px - 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+import random
+import unittest
+import unittest.mock
+
+import engine
+import network
+
+
+class Loopback(network.Transport):
+
+    # delivers packets straight to the other end, or drops them
+
+    def __init__(self, name):
+        network.Transport.__init__(self)
+        self.name = name
+        self.other = None
+        self.drop = False
+
+    def send(self, data):
+        if not self.drop and self.other.receiver is not None:
+            self.other.receiver(self.name, data)
+
+
+class Room:
+
+    # a Telepathy text channel as seen by each member of the activity
+
+    def __init__(self):
+        self.members = []
+
+    def join(self):
+        channel = Channel(self, len(self.members) + 1)
+        self.members.append(channel)
+        return channel
+
+
+class Channel:
+
+    def __init__(self, room, handle):
+        self.room = room
+        self.handle = handle
+        self.received = []
+        self.acknowledged = []
+
+    def __getitem__(self, interface):
+        return self
+
+    def GetSelfHandle(self):
+        return self.handle
+
+    def connect_to_signal(self, name, callback):
+        self.received.append(callback)
+        return unittest.mock.Mock()
+
+    def Send(self, message_type, text):
+        # everyone gets the message, the sender too
+        for member in self.room.members:
+            for callback in member.received:
+                callback(len(member.acknowledged), 0, self.handle,
+                         message_type, 0, text)
+
+    def AcknowledgePendingMessages(self, ids):
+        self.acknowledged.extend(ids)
+
+
+class TextChannelTest(unittest.TestCase):
+
+    def test_packets(self):
+        room = Room()
+        a = network.TextChannelTransport(room.join())
+        b = network.TextChannelTransport(room.join())
+        got = {a: [], b: []}
+        a.receiver = lambda peer, data: got[a].append((peer, data))
+        b.receiver = lambda peer, data: got[b].append((peer, data))
+        a.send(b'\0\xb9packet')
+        self.assertEqual(got, {a: [], b: [(1, b'\0\xb9packet')]})
+        # chat on the same channel is not a packet
+        room.members[1].Send(0, 'hello')
+        self.assertEqual(got[a], [])
+        self.assertEqual(room.members[0].acknowledged, [0, 1])
+
+    def test_session(self):
+        room = Room()
+        owner = engine.Engine(seed=1)
+        session = network.Session(
+            network.TextChannelTransport(room.join()), owner)
+        remote = network.Session(
+            network.TextChannelTransport(room.join()), engine.Engine(seed=1))
+
+        def engine_cb(event, arg):
+            if event == engine.LOCK:
+                session.lock()
+        owner.listener = engine_cb
+        for i in range(60):
+            owner.tick()
+            session.flush()
+            remote.flush()
+        self.assertEqual(remote.peers[1].engine.rows, owner.rows)
+
+
+class SessionTest(unittest.TestCase):
+
+    def setUp(self):
+        a, b = Loopback('a'), Loopback('b')
+        a.other, b.other = b, a
+        self.transport = a
+        self.owner = engine.Engine(seed=1, listener=self.engine_cb)
+        self.session = network.Session(a, self.owner)
+        self.remote = network.Session(b, engine.Engine(seed=1))
+        self.rng = random.Random(1)
+
+    def engine_cb(self, event, arg):
+        # as versus.Versus reports the local board
+        if event == engine.LOCK:
+            self.session.lock()
+        elif event == engine.CLEAR:
+            self.session.clear(arg)
+        elif event == engine.GAME_OVER:
+            self.session.game_over()
+
+    def mirror(self):
+        return self.remote.peers['a'].engine
+
+    def tick(self, garbage=False, moves=True):
+        owner = self.owner
+        if moves:
+            owner.step(self.rng.choice((engine.LEFT, engine.RIGHT,
+                                        engine.ROTATE, engine.DROP)))
+        dealt = owner.dealt
+        owner.tick()
+        if garbage and owner.dealt != dealt and not owner.clearing and \
+           not owner.game_over:
+            # garbage in the same wakeup as the lock, as Versus.timer does
+            hole = self.rng.randrange(owner.bw)
+            self.session.garbage(1, hole)
+            owner.add_garbage(1, hole)
+        self.session.flush()
+        self.remote.flush()
+
+    def test_mirror_follows_owner(self):
+        while not self.owner.game_over:
+            self.tick()
+            if not self.owner.clearing:
+                self.assertEqual(self.mirror().rows, self.owner.rows)
+        self.assertTrue(self.mirror().game_over)
+        self.assertEqual(self.mirror().score, self.owner.score)
+
+    def test_garbage_does_not_end_mirror(self):
+        while not self.owner.game_over:
+            self.tick(garbage=True)
+            self.assertEqual(self.mirror().game_over, self.owner.game_over)
+            if not self.owner.clearing:
+                self.assertEqual(self.mirror().rows, self.owner.rows)
+
+    def test_resync_after_lost_packets(self):
+        # figures fall straight down, locking every few ticks
+        for i in range(20):
+            self.tick(moves=False)
+        self.transport.drop = True
+        for i in range(40):
+            self.tick(moves=False)
+        self.transport.drop = False
+        for i in range(5):
+            self.tick(moves=False)
+        self.assertFalse(self.owner.game_over)
+        self.assertFalse(self.remote.peers['a'].desynced)
+        self.assertFalse(self.owner.clearing)
+        self.assertEqual(self.mirror().rows, self.owner.rows)
+        self.assertEqual(self.mirror().glass, self.owner.glass)
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        eng = engine.Engine(seed=2)
+        eng.add_garbage(3, 4)
+        eng.score, eng.linecount = 1234, 56
+        data = bytearray()
+        network.encode_snapshot(eng, data)
+        other = engine.Engine(seed=3)
+        self.assertEqual(network.decode_snapshot(other, data, 0), len(data))
+        self.assertEqual(other.glass, eng.glass)
+        self.assertEqual(other.rows, eng.rows)
+        self.assertEqual(other.heights, eng.heights)
+        self.assertEqual((other.score, other.linecount), (1234, 56))
+
+    def test_truncated(self):
+        data = bytearray()
+        network.encode_snapshot(engine.Engine(seed=2), data)
+        with self.assertRaises(IndexError):
+            network.decode_snapshot(engine.Engine(), data[:50], 0)
@@ -0,0 +1,71 @@
+import random
+import unittest
+
+import engine
+import replay
+
+
+def record(seed, rng):
+    # a whole game with random input, as BlockParty records it
+    eng = engine.Engine(seed=seed)
+    eng.set_level(3)
+    recorder = replay.Recorder(eng)
+    while not eng.game_over:
+        if rng.random() < 0.3:
+            eng.step(rng.choice((engine.LEFT, engine.RIGHT,
+                                 engine.ROTATE, engine.DROP)))
+        elif rng.random() < 0.05:
+            eng.speed_up()
+        elif rng.random() < 0.05:
+            eng.slow_down()
+        eng.tick()
+        if eng.clearing:
+            eng.tick()
+    return eng, recorder.encode()
+
+
+class ReplayTest(unittest.TestCase):
+
+    def test_varint(self):
+        out = bytearray()
+        values = (0, 1, 127, 128, 300, 1 << 32)
+        for value in values:
+            replay.write_varint(out, value)
+        pos = 0
+        for value in values:
+            decoded, pos = replay.read_varint(out, pos)
+            self.assertEqual(decoded, value)
+        self.assertEqual(pos, len(out))
+
+    def test_run(self):
+        rng = random.Random(1)
+        for seed in range(10):
+            eng, data = record(seed, rng)
+            played = replay.run(replay.Recording.decode(data))
+            self.assertTrue(played.game_over)
+            self.assertEqual(played.score, eng.score)
+            self.assertEqual(played.linecount, eng.linecount)
+            self.assertEqual(played.glass, eng.glass)
+
+    def test_player(self):
+        # fed a tick at a time, as BlockParty plays a recording back
+        eng, data = record(5, random.Random(2))
+        recording = replay.Recording.decode(data)
+        played = recording.new_engine()
+        player = replay.Player(recording)
+        for code in player.actions():
+            replay.apply(played, code)
+        while not played.game_over:
+            played.tick()
+            player.tick()
+            for code in player.actions():
+                replay.apply(played, code)
+        self.assertEqual(played.score, eng.score)
+        self.assertEqual(played.glass, eng.glass)
+
+    def test_bad_data(self):
+        eng, data = record(3, random.Random(3))
+        with self.assertRaises(ValueError):
+            replay.Recording.decode(b'XYZ' + data[3:])
+        with self.assertRaises(ValueError):
+            replay.Recording.decode(data[:5])
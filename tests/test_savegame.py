@@ -0,0 +1,68 @@
+import random
+import unittest
+
+import engine
+import savegame
+
+FIELDS = ('glass', 'rows', 'heights', 'score', 'linecount', 'level',
+          'bonus', 'figure_score', 'can_speed_up', 'time_step', 'seed',
+          'dealt', 'figure', 'rotation', 'next_figure', 'next_rotation',
+          'px', 'py', 'clearing')
+
+
+def midgame(seed, rng, ticks):
+    eng = engine.Engine(seed=seed)
+    eng.set_level(2)
+    for i in range(ticks):
+        if rng.random() < 0.2:
+            eng.step(rng.choice((engine.LEFT, engine.RIGHT,
+                                 engine.ROTATE)))
+        eng.tick()
+    return eng
+
+
+class SaveGameTest(unittest.TestCase):
+
+    def assertSameGame(self, a, b):
+        for name in FIELDS:
+            self.assertEqual(getattr(a, name), getattr(b, name), name)
+        self.assertEqual(a.rng.getstate(), b.rng.getstate())
+
+    def test_round_trip(self):
+        rng = random.Random(1)
+        for seed in range(20):
+            eng = midgame(seed, rng, 60)
+            if eng.game_over:
+                continue
+            data = savegame.encode(eng)
+            self.assertLess(len(data), 150)
+            restored = engine.Engine()
+            savegame.decode(restored, data)
+            self.assertSameGame(restored, eng)
+            # and both go on dealing the same figures
+            for i in range(100):
+                eng.tick()
+                restored.tick()
+            self.assertSameGame(restored, eng)
+
+    def test_clearing(self):
+        eng = engine.Engine(seed=4)
+        eng.add_garbage(2, 0)
+        for i in range(2):
+            eng.rows[i] = eng.full
+            eng.glass[i][0] = 1
+        eng.update_heights()
+        eng.lock_py = 0
+        eng.chk_glass()
+        self.assertEqual(len(eng.clearing), 2)
+        restored = engine.Engine()
+        savegame.decode(restored, savegame.encode(eng))
+        self.assertSameGame(restored, eng)
+
+    def test_bad_data(self):
+        data = savegame.encode(engine.Engine(seed=1))
+        for bad in (b'', b'BPG', b'XYZ' + data[3:], data[:20]):
+            with self.assertRaises(ValueError):
+                savegame.decode(engine.Engine(), bad)
+        with self.assertRaises(ValueError):
+            savegame.decode(engine.Engine(10, 20), data)
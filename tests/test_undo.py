@@ -0,0 +1,108 @@
+import random
+import unittest
+
+import engine
+import undo
+
+
+def state(eng):
+    return ([bytes(row) for row in eng.glass], list(eng.rows),
+            list(eng.heights), eng.score, eng.linecount, eng.level,
+            eng.dealt, eng.figure, eng.rotation, eng.next_figure,
+            eng.next_rotation, eng.px, eng.py, eng.figure_score,
+            eng.rng.getstate())
+
+
+class HistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = engine.Engine(seed=7)
+        self.history = undo.History(self.engine, 5)
+        self.history.capture()
+        self.states = {self.engine.dealt: state(self.engine)}
+        self.rng = random.Random(7)
+
+    def place(self):
+        # play on to the next figure and capture it, as BlockParty does
+        eng = self.engine
+        dealt = eng.dealt
+        while eng.dealt == dealt or eng.clearing:
+            if self.rng.random() < 0.3:
+                eng.step(self.rng.choice((engine.LEFT, engine.RIGHT,
+                                          engine.ROTATE)))
+            eng.tick()
+        if not eng.game_over:
+            self.history.capture()
+            self.states[eng.dealt] = state(eng)
+
+    def assertRestored(self):
+        self.assertEqual(state(self.engine), self.states[self.engine.dealt])
+
+    def test_slot_size(self):
+        self.assertLess(self.history.slot_size, 100)
+
+    def test_undo_redo(self):
+        for i in range(3):
+            self.place()
+        last = self.engine.dealt
+        self.assertTrue(self.history.undo())
+        self.assertRestored()
+        self.assertTrue(self.history.undo())
+        self.assertRestored()
+        self.assertTrue(self.history.redo())
+        self.assertTrue(self.history.redo())
+        self.assertFalse(self.history.redo())
+        self.assertEqual(self.engine.dealt, last)
+        self.assertRestored()
+
+    def test_undo_after_game_over(self):
+        # the figure that ended the game is taken back first
+        eng = self.engine
+        while not eng.game_over:
+            self.place()
+        last = self.history.dealt
+        self.assertTrue(self.history.undo())
+        self.assertEqual(eng.dealt, last)
+        self.assertFalse(eng.game_over)
+        self.assertRestored()
+        self.assertTrue(self.history.undo())
+        self.assertLess(eng.dealt, last)
+        self.assertRestored()
+
+    def test_figure_score(self):
+        # kept as it was, since the level may have gone up after the
+        # figure came
+        eng = self.engine
+        eng.figure_score -= 1
+        self.history.capture()
+        self.states[eng.dealt] = state(eng)
+        self.place()
+        self.history.undo()
+        self.assertRestored()
+
+    def test_depth(self):
+        for i in range(8):
+            self.place()
+        undone = 0
+        while self.history.undo():
+            undone += 1
+            self.assertRestored()
+        self.assertEqual(undone, 5)
+
+    def test_new_placement_drops_redo(self):
+        for i in range(3):
+            self.place()
+        self.history.undo()
+        self.place()
+        self.assertFalse(self.history.redo())
+
+    def test_restore_invalidates_ghost(self):
+        for i in range(3):
+            self.place()
+        eng = self.engine
+        version = eng.glass_version
+        eng.ghost_py()
+        self.history.undo()
+        self.assertGreater(eng.glass_version, version)
+        self.assertEqual(eng.ghost_py(),
+                         eng.scan_landing_py(eng.shape, eng.px, eng.py))
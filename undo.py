@@ -0,0 +1,174 @@
+#
+# Copyright (c) 2026 Sugar Labs
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+#  Undo and redo of figure placements for practice games.
+#
+#  The state at every new figure is kept in a ring buffer of fixed size
+#  slots allocated once.  A slot is HEADER (score, lines, figures dealt,
+#  current and next figure as figure << 2 | rotation, level, figure
+#  score) followed by the glass as three bit planes, bit k of every cell
+#  color, each a bitmask of the whole glass with row i at bit i * bw.
+#  An 11x20 glass takes 98 bytes a slot.
+#
+#  The figures still to come are restored by reseeding the generator,
+#  as in savegame.py.
+
+import struct
+
+import engine
+
+HEADER = struct.Struct('<IHIBBBB')
+PLANES = 3
+
+# maps b'0' or b'1' to the bit of one plane in a cell color
+_FROM_BITS = [bytes((1 << k) * (c == 49) for c in range(256))
+              for k in range(PLANES)]
+
+
+class History:
+
+    def __init__(self, eng, depth=50):
+        self.engine = eng
+        self.cells = eng.bw * eng.bh
+        self.plane_size = (self.cells + 7) // 8
+        self.slot_size = HEADER.size + PLANES * self.plane_size
+        # the present state and depth earlier ones
+        self.slots = depth + 1
+        self.buffer = bytearray(self.slots * self.slot_size)
+        self.blank = bytes(PLANES * self.plane_size)
+        self.current = None
+        self.back = self.forward = 0
+        # figures dealt when the present state was captured
+        self.dealt = None
+
+    def capture(self):
+        # keep the engine state as the present one, dropping anything
+        # that could have been redone and the oldest state when full
+        eng = self.engine
+        if self.current is None:
+            self.current = 0
+        else:
+            self.current = (self.current + 1) % self.slots
+            self.back = min(self.back + 1, self.slots - 1)
+        self.forward = 0
+        self.dealt = eng.dealt
+        self.write(self.current * self.slot_size)
+
+    def write(self, offset):
+        # straight into the slot, bit by bit, so that capturing builds no
+        # copies of the glass
+        eng = self.engine
+        buffer = self.buffer
+        HEADER.pack_into(buffer, offset, eng.score, eng.linecount,
+                         eng.dealt, eng.figure << 2 | eng.rotation,
+                         eng.next_figure << 2 | eng.next_rotation, eng.level,
+                         eng.figure_score)
+        offset += HEADER.size
+        size = self.plane_size
+        buffer[offset:offset + PLANES * size] = self.blank
+        bw = eng.bw
+        for i in range(eng.bh):
+            if not eng.rows[i]:
+                continue
+            row = eng.glass[i]
+            for j in range(bw):
+                color = row[j]
+                if color:
+                    n = i * bw + j
+                    byte = offset + (n >> 3)
+                    bit = 1 << (n & 7)
+                    if color & 1:
+                        buffer[byte] |= bit
+                    if color & 2:
+                        buffer[byte + size] |= bit
+                    if color & 4:
+                        buffer[byte + 2 * size] |= bit
+
+    def undo(self):
+        if self.engine.dealt != self.dealt:
+            # a figure was locked since the last capture, as when the
+            # game ended, and going back to that capture takes it back
+            self.restore()
+            return True
+        if not self.back:
+            return False
+        self.back -= 1
+        self.forward += 1
+        self.current = (self.current - 1) % self.slots
+        self.restore()
+        return True
+
+    def redo(self):
+        if not self.forward:
+            return False
+        self.forward -= 1
+        self.back += 1
+        self.current = (self.current + 1) % self.slots
+        self.restore()
+        return True
+
+    def restore(self):
+        eng = self.engine
+        offset = self.current * self.slot_size
+        (score, lines, dealt, current, following, level,
+         figure_score) = HEADER.unpack_from(self.buffer, offset)
+        offset += HEADER.size
+        colors = 0
+        occupied = 0
+        for table in _FROM_BITS:
+            plane = int.from_bytes(
+                self.buffer[offset:offset + self.plane_size], 'little')
+            occupied |= plane
+            bits = format(plane, '0%db' % self.cells)[::-1].encode()
+            colors |= int.from_bytes(bits.translate(table), 'little')
+            offset += self.plane_size
+        cells = colors.to_bytes(self.cells, 'little')
+        bw = eng.bw
+        for i in range(eng.bh):
+            eng.glass[i][:] = cells[i * bw:(i + 1) * bw]
+            eng.rows[i] = occupied >> (i * bw) & eng.full
+        eng.update_heights()
+        eng.glass_version += 1
+
+        if dealt < eng.dealt:
+            eng.rng.seed(eng.seed)
+            eng.dealt = 0
+        eng.skip_figures(dealt - eng.dealt)
+        self.dealt = dealt
+        eng.score = score
+        eng.linecount = lines
+        eng.bonus = 0
+        eng.clearing = []
+        eng.game_over = False
+        eng.soft_drop = False
+        eng.can_speed_up = True
+        eng.set_level(level)
+        eng.figure, eng.rotation = current >> 2, current & 3
+        eng.next_figure, eng.next_rotation = following >> 2, following & 3
+        eng.shape = engine.ORIENTATIONS[eng.figure][eng.rotation]
+        eng.next_shape = engine.ORIENTATIONS[eng.next_figure][
+            eng.next_rotation]
+        eng.figure_score = figure_score
+        eng.px = eng.bw // 2 - 2
+        eng.py = eng.bh - 3
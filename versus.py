@@ -0,0 +1,397 @@
+#
+# Copyright (c) 2026 Sugar Labs
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+#  Versus games: two to four boards side by side on the one drawing
+#  area, played on one keyboard or over the network, see network.py.
+#  Each board is only an engine and a little input and drawing state;
+#  colors, fonts, text layouts, sounds and the timer belong to the
+#  BlockParty that owns the game.
+
+import random
+import time
+
+import cairo
+from gi.repository import Pango
+
+import engine
+import network
+
+# left, right, rotate, soft drop and drop keys of each player
+KEYMAPS = (
+    (['a', 'A'], ['d', 'D'], ['w', 'W'], ['s', 'S'], ['e', 'E']),
+    (['Left'], ['Right'], ['Up'], ['Down'], ['space']),
+    (['j', 'J'], ['l', 'L'], ['i', 'I'], ['k', 'K'], ['o', 'O']),
+    (['KP_4', 'KP_Left'], ['KP_6', 'KP_Right'], ['KP_8', 'KP_Up'],
+     ['KP_5', 'KP_Begin'], ['KP_0', 'KP_Insert']),
+)
+
+# rows sent to every opponent for clearing 1, 2, 3 and 4 lines
+GARBAGE = (0, 1, 2, 4)
+
+
+class Board:
+
+    def __init__(self, index, keymap, eng, remote=False):
+        self.index = index
+        self.engine = eng
+        # mirrors another player's board, which moves only on their side
+        self.remote = remote
+        self.keys = engine.KeyRepeat()
+        self.actions = {}
+        for keys, action in zip(keymap, (engine.LEFT, engine.RIGHT,
+                                         engine.ROTATE, engine.SOFT_DROP,
+                                         engine.DROP)):
+            for key in keys:
+                self.actions[key] = action
+        self.next_tick = time.time() + self.engine.time_step
+        self.clear_start = 0
+        self.clear_phase = 0
+        # rows sent by opponents, added once the board is not clearing
+        self.garbage = 0
+        self.view_boxes = None
+        # top left corner of the glass
+        self.x = self.y = 0
+
+
+class Versus:
+
+    max_boards = len(KEYMAPS)
+
+    def __init__(self, game, players, level, transport=None):
+        self.game = game
+        self.rng = random.Random()
+        seed = self.rng.randrange(1 << 32)
+        self.boards = []
+        for i in range(players):
+            # the same seed deals every player the same figures
+            eng = engine.Engine(game.bw, game.bh, seed=seed)
+            eng.set_level(level)
+            eng.listener = self.listener(i)
+            keymap = KEYMAPS[1] if transport is not None else KEYMAPS[i]
+            self.boards.append(Board(i, keymap, eng))
+        self.session = None
+        self.remote_boards = {}
+        if transport is not None:
+            self.session = network.Session(
+                transport, self.boards[0].engine, self.session_cb)
+        self.winner = None
+        self.over = False
+        self.font = game.font.copy()
+        self.size = None
+        self.static_surface = None
+
+    def listener(self, index):
+        def engine_cb(event, arg):
+            self.engine_cb(self.boards[index], event, arg)
+        return engine_cb
+
+    def session_cb(self, peer, event, arg):
+        board = self.remote_boards.get(peer)
+        if board is None:
+            if len(self.boards) == self.max_boards:
+                return
+            board = Board(len(self.boards), (),
+                          self.session.peers[peer].engine, True)
+            self.boards.append(board)
+            self.remote_boards[peer] = board
+            self.size = None
+            self.game.da.queue_draw()
+        if event == engine.CLEAR:
+            local = self.boards[0]
+            if not local.engine.game_over:
+                local.garbage += GARBAGE[min(len(arg), len(GARBAGE)) - 1]
+        elif event == engine.GAME_OVER:
+            self.check_winner(board)
+        elif event is None:
+            self.queue_draw_board(board, True)
+            self.queue_draw_header(board)
+            # answer snapshot requests without waiting for a tick
+            self.session.flush()
+
+    def close(self):
+        if self.session is not None:
+            self.session.flush()
+            self.session.transport.receiver = None
+
+    @property
+    def finished(self):
+        return self.over
+
+    def layout(self):
+        # recomputed only when the drawing area changed size
+        game = self.game
+        size = (game.window_w, game.window_h)
+        if size == self.size:
+            return
+        self.size = size
+        width, height = size
+        n = len(self.boards)
+        bw, bh = game.bw, game.bh
+        column = width / n
+        self.cell = max(1, int(min(column / (bw + 2), height / (bh + 5))))
+        self.header = 3 * self.cell
+        top = int((height - (bh + 3) * self.cell) / 2) + self.header
+        for board in self.boards:
+            board.x = int(board.index * column + (column - bw * self.cell) / 2)
+            board.y = top
+            board.view_boxes = None
+        self.font.set_size(max(1, int(self.cell * 0.8 * Pango.SCALE)))
+        self.static_surface = None
+
+    def engine_cb(self, board, event, arg):
+        game = self.game
+        if self.session is not None:
+            if event == engine.LOCK:
+                self.session.lock()
+            elif event == engine.CLEAR:
+                self.session.clear(arg)
+            elif event == engine.GAME_OVER:
+                self.session.game_over()
+        if event == engine.LOCK:
+            self.queue_draw_header(board)
+            game.make_sound('heart.wav')
+        elif event == engine.NEXT:
+            self.queue_draw_header(board)
+        elif event == engine.CLEAR:
+            board.clear_start = time.time()
+            board.clear_phase = 0
+            game.make_sound('boom.au')
+            rows = GARBAGE[min(len(arg), len(GARBAGE)) - 1]
+            for other in self.boards:
+                if other is not board and not other.remote and \
+                   not other.engine.game_over:
+                    other.garbage += rows
+            self.queue_draw_board(board, True)
+        elif event == engine.GAME_OVER:
+            game.make_sound('lost.wav')
+            board.keys.release_all()
+            self.check_winner(board)
+
+    def check_winner(self, board):
+        alive = [b for b in self.boards if not b.engine.game_over]
+        if len(alive) <= 1 and not self.finished:
+            self.over = True
+            # nobody wins a shared game that nobody else joined
+            if len(self.boards) > 1:
+                self.winner = alive[0] if alive else board
+                self.game.make_sound('wah.au')
+        self.queue_draw_board(board, True)
+
+    def board_for_key(self, key):
+        for board in self.boards:
+            if key in board.actions:
+                return board, board.actions[key]
+        return None, None
+
+    def key_press(self, key):
+        board, action = self.board_for_key(key)
+        if board is None or board.engine.game_over or self.finished:
+            return False
+        if action == engine.SOFT_DROP:
+            board.engine.speed_up()
+            return False
+        return board.keys.press(action, time.time())
+
+    def key_release(self, key):
+        board, action = self.board_for_key(key)
+        if board is None:
+            return
+        if action == engine.SOFT_DROP:
+            board.engine.slow_down()
+        else:
+            board.keys.release(action)
+
+    def release_all(self):
+        for board in self.boards:
+            board.keys.release_all()
+            board.engine.slow_down()
+
+    def process_input(self, now):
+        for board in self.boards:
+            self.apply_keys(board, now)
+
+    def apply_keys(self, board, now):
+        eng = board.engine
+        changed = False
+        for action in board.keys.poll(now, bool(eng.clearing)):
+            changed = eng.step(action) or changed
+        if changed:
+            self.queue_draw_board(board, False)
+
+    def deadlines(self):
+        deadlines = []
+        if self.finished:
+            return deadlines
+        for board in self.boards:
+            if board.engine.game_over or board.remote:
+                continue
+            deadlines.append(board.next_tick)
+            deadlines.append(board.keys.deadline())
+            if board.engine.clearing:
+                flash = self.game.clear_flash_time
+                deadlines.append(
+                    board.clear_start + (board.clear_phase + 1) * flash)
+        return deadlines
+
+    def timer(self, now):
+        # all boards are driven from the one BlockParty timer
+        self.process_input(now)
+        for board in self.boards:
+            if board.remote:
+                continue
+            eng = board.engine
+            board.next_tick = self.game.catch_up(
+                eng, board.next_tick, lambda: self.tick(board),
+                lambda: not eng.game_over and not self.finished)
+            if eng.clearing:
+                elapsed = now - board.clear_start
+                phase = int(elapsed / self.game.clear_flash_time)
+                if phase != board.clear_phase:
+                    board.clear_phase = phase
+                    self.queue_draw_board(board, True)
+        if self.session is not None:
+            # everything from this wakeup goes out as one packet
+            self.session.flush()
+
+    def tick(self, board):
+        eng = board.engine
+        clearing = eng.clearing
+        eng.tick()
+        if clearing and not eng.clearing and board.keys.pending:
+            # keys pressed during the flash move the new figure
+            self.apply_keys(board, time.time())
+        if board.garbage and not eng.clearing:
+            hole = self.rng.randrange(eng.bw)
+            if self.session is not None:
+                self.session.garbage(board.garbage, hole)
+            eng.add_garbage(board.garbage, hole)
+            board.garbage = 0
+            clearing = True
+        self.queue_draw_board(board, bool(clearing))
+
+    def queue_draw_board(self, board, redraw):
+        self.layout()
+        game = self.game
+        cell = self.cell
+        boxes = game.piece_boxes(board.engine)
+        if redraw or board.view_boxes is None:
+            game.da.queue_draw_area(board.x, board.y, game.bw * cell,
+                                    game.bh * cell)
+        else:
+            for x, y, w, h in set(board.view_boxes + boxes):
+                game.da.queue_draw_area(board.x + x * cell,
+                                        board.y + (game.bh - y - h) * cell,
+                                        w * cell, h * cell)
+        board.view_boxes = boxes
+        if self.finished:
+            game.da.queue_draw()
+
+    def queue_draw_header(self, board):
+        self.layout()
+        self.game.da.queue_draw_area(board.x, board.y - self.header,
+                                     self.game.bw * self.cell, self.header)
+
+    def draw_static(self, cairo_ctx):
+        game = self.game
+        if self.static_surface is None:
+            self.static_surface = game.da.get_window().create_similar_surface(
+                cairo.CONTENT_COLOR, game.window_w, game.window_h)
+            ctx = cairo.Context(self.static_surface)
+            back, frame, glass = (game.color_back, game.color_glass,
+                                  game.color_glass_back)
+            ctx.set_source_rgb(back.red, back.green, back.blue)
+            ctx.paint()
+            cell = self.cell
+            ctx.set_source_rgb(frame.red, frame.green, frame.blue)
+            for board in self.boards:
+                ctx.rectangle(board.x - cell / 2, board.y,
+                              cell * (game.bw + 1), cell * game.bh + cell / 2)
+            ctx.fill()
+            ctx.set_source_rgb(glass.red, glass.green, glass.blue)
+            for board in self.boards:
+                ctx.rectangle(board.x, board.y,
+                              cell * game.bw - game.gridwidth,
+                              cell * game.bh - game.gridwidth)
+            ctx.fill()
+        cairo_ctx.set_source_surface(self.static_surface, 0, 0)
+        cairo_ctx.paint()
+
+    def draw(self, cairo_ctx, clip):
+        self.layout()
+        game = self.game
+        self.draw_static(cairo_ctx)
+        # the cells of all boards are batched by color, so the number of
+        # fills does not grow with the number of players
+        batches = {}
+        for board in self.boards:
+            game.batch_cells(batches, board.engine, board.x, board.y,
+                             self.cell, clip, board.clear_phase,
+                             piece=not board.engine.game_over)
+        game.fill_cells(cairo_ctx, batches, self.cell)
+
+        for board in self.boards:
+            if clip.y < board.y and clip.y + clip.height > \
+               board.y - self.header:
+                self.draw_header(cairo_ctx, board)
+        self.draw_posters(cairo_ctx)
+
+    def draw_header(self, cairo_ctx, board):
+        # player, score and lines on the left, the next figure on the right
+        game = self.game
+        eng = board.engine
+        text = game.color_ui_text
+        cairo_ctx.set_source_rgb(text.red, text.green, text.blue)
+        game.draw_string(cairo_ctx, 'P%d  %d\n%d lines' % (
+            board.index + 1, eng.score, eng.linecount),
+            board.x, board.y - self.header, False, self.font)
+        cairo_ctx.fill()
+        half = self.cell / 2
+        x = board.x + game.bw * self.cell - 4 * half
+        y = board.y - self.header + half
+        for i, j, c in eng.next_shape.cells:
+            cairo_ctx.set_source_rgba(*game.rgba[c])
+            cairo_ctx.rectangle(x + j * half, y + (3 - i) * half,
+                                half - game.gridwidth, half - game.gridwidth)
+            cairo_ctx.fill()
+
+    def draw_posters(self, cairo_ctx):
+        game = self.game
+        for board in self.boards:
+            if not board.engine.game_over and board is not self.winner:
+                continue
+            text = 'WINNER' if board is self.winner else 'GAME OVER'
+            x = board.x + game.bw * self.cell / 2
+            y = board.y + (game.bh / 2 - 1) * self.cell
+            back = game.colors[0]
+            cairo_ctx.set_source_rgb(back.red, back.green, back.blue)
+            cairo_ctx.rectangle(board.x, y - self.cell,
+                                game.bw * self.cell, 4 * self.cell)
+            cairo_ctx.fill()
+            score = game.color_score
+            cairo_ctx.set_source_rgb(score.red, score.green, score.blue)
+            game.draw_string(cairo_ctx, text, x, y, True, self.font)
+            if self.finished:
+                game.draw_string(cairo_ctx, 'Enter to continue', x,
+                                 y + 1.5 * self.cell, True, self.font)
+            cairo_ctx.fill()